@@ -3,8 +3,25 @@
 # Transporting Cows Across Space
 
 
-from ps1_partition import get_partitions
+from ps1_bounds import lower_bound
+from ps1_partition import get_feasible_partitions, init_shard_search, \
+    search_shard, subset_weights
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+import array
+import bisect
+import functools
+import heapq
+import json
+import mmap
+import multiprocessing
+import operator
+import os
+import random
+import struct
+import sys
 import time
+import tracemalloc
 
 
 def load_cows(filename):
@@ -21,94 +38,907 @@ def load_cows(filename):
     a dictionary of cow name (string), weight (int) pairs
     """
     cow_dict = dict()
-    f = open(filename, 'r')
-    for line in f:
-        line_data = line.split(',')
-        cow_dict[line_data[0]] = int(line_data[1])
+    with open(filename, 'r') as f:
+        for line in f:
+            line_data = line.split(',')
+            cow_dict[line_data[0]] = int(line_data[1])
     return cow_dict
 
 
-def greedy_cow_transport(cows, limit=10):
+class CowManifest(Mapping):
+    """
+    A read-only dictionary of cow name (string), weight (int) pairs that keeps
+    the weights in one flat 64-bit integer buffer and the names in a parallel
+    list, instead of one Python int per cow. Any of the transport functions
+    can take a CowManifest wherever they take a dictionary of cows.
+
+    The name to position index used for looking up a single cow is only built
+    the first time it is needed; iterating over the names, values() and
+    items() does not need it.
+    """
+    def __init__(self, names, weights, buffer=None):
+        """
+        names - a list of cow names (strings)
+        weights - a sequence of 64-bit ints (an array or a memoryview) with
+        the weight of each cow in names
+        buffer - the memory map the weights live in, if any, kept open for as
+        long as the manifest is
+        """
+        self.names = names
+        self.weights = weights
+        self.buffer = buffer
+        self.index = None
+
+    def __getitem__(self, name):
+        if self.index is None:
+            self.index = {name: i for i, name in enumerate(self.names)}
+        return self.weights[self.index[name]]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def values(self):
+        return self.weights
+
+    def items(self):
+        return zip(self.names, self.weights)
+
+
+# Header of a manifest cache: magic, size and modification time of the data
+# file it was built from, number of cows and length of the encoded names
+CACHE_HEADER = struct.Struct('=8sqqqq')
+CACHE_MAGIC = b'COWS\x00\x00\x00\x01'
+
+
+def load_cows_compact(filename, cache=True, chunk_size=1 << 20):
+    """
+    Read the same comma-separated cow name, weight pairs as load_cows, but
+    return them as a CowManifest. The file is parsed a chunk of lines at a
+    time, names are interned and weights go straight into an array.
+
+    Unless cache is False, the parsed manifest is also written to
+    filename + '.cowcache' (weights then names, in this machine's byte order),
+    and later calls memory-map that file instead of parsing the data file
+    again for as long as the data file's size and modification time do not
+    change.
+
+    Parameters:
+    filename - the name of the data file as a string
+    cache - whether to read and write the binary cache (a bool)
+    chunk_size - roughly how many bytes of the data file to parse at once
+
+    Returns:
+    a CowManifest of cow name (string), weight (int) pairs
+    """
+    stat = os.stat(filename)
+    cacheName = filename + '.cowcache'
+    if cache:
+        try:
+            with open(cacheName, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            buffer = None
+        if buffer is not None and len(buffer) >= CACHE_HEADER.size:
+            magic, size, mtime, count, namesLength = \
+                CACHE_HEADER.unpack_from(buffer)
+            start = CACHE_HEADER.size
+            end = start + 8 * count
+            if (magic == CACHE_MAGIC and size == stat.st_size and
+                    mtime == stat.st_mtime_ns and
+                    len(buffer) == end + namesLength):
+                weights = memoryview(buffer)[start:end].cast('q')
+                names = [sys.intern(name) for name in
+                         buffer[end:].decode('utf-8').split('\n')]
+                if count == 0:
+                    names = []
+                return CowManifest(names, weights, buffer)
+    names = []
+    weights = array.array('q')
+    with open(filename, 'r') as f:
+        for lines in iter(lambda: f.readlines(chunk_size), []):
+            for line in lines:
+                line_data = line.split(',')
+                names.append(sys.intern(line_data[0]))
+                weights.append(int(line_data[1]))
+    if cache:
+        encodedNames = '\n'.join(names).encode('utf-8')
+        temporaryName = cacheName + '.%d' % os.getpid()
+        with open(temporaryName, 'wb') as f:
+            f.write(CACHE_HEADER.pack(CACHE_MAGIC, stat.st_size,
+                                      stat.st_mtime_ns, len(names),
+                                      len(encodedNames)))
+            f.write(weights.tobytes())
+            f.write(encodedNames)
+        os.replace(temporaryName, cacheName)
+    return CowManifest(names, weights)
+
+
+def sort_cows(weights):
+    """
+    Sorts cows from largest to smallest, breaking ties the same way as
+    reversing a stable sort by weight.
+
+    Parameters:
+    weights - a list of cow weights (ints)
+
+    Returns:
+    a list of positions in weights, largest cow first
+    """
+    return sorted(range(len(weights)), key=lambda i: (weights[i], i),
+                  reverse=True)
+
+
+def pack_cows(names, weights, order, limit, strategy='largest'):
+    """
+    Packs already sorted cows into trips with one of the greedy strategies of
+    greedy_cow_transport, so the sorting can be shared between calls.
+
+    Parameters:
+    names - a list of cow names (strings)
+    weights - a list of the weights (ints) of the cows in names
+    order - the positions in names from sort_cows(weights)
+    limit - weight limit of the spaceship (an int)
+    strategy - 'largest', 'first_fit_decreasing' or 'best_fit_decreasing'
+
+    Returns:
+    A list of lists, with each inner list containing the names of cows
+    transported on a particular trip and the overall list containing all the
+    trips
+    """
+    result = []
+    if strategy == 'largest':
+        # (weight, position) of every cow, smallest first, numbered from 1
+        # so 0 can stand for no cow at all
+        ascending = [(weights[i], i) for i in reversed(order)]
+        # below[k] leads down to the nearest cow numbered k or less that is
+        # still left (k itself when it is), with the paths halved on every
+        # search, so finding the largest cow left that fits is a bisect plus
+        # nearly constant work
+        below = list(range(len(ascending) + 1))
+        cowsLeft = len(ascending)
+        while cowsLeft > 0:
+            trip = []
+            room = limit
+            k = bisect.bisect_right(ascending, (room, len(names)))
+            while True:
+                while below[k] != k:
+                    below[k] = below[below[k]]
+                    k = below[k]
+                if k == 0:
+                    break
+                weight, i = ascending[k - 1]
+                below[k] = k - 1
+                cowsLeft -= 1
+                trip.append(names[i])
+                room -= weight
+                k = bisect.bisect_right(ascending, (room, len(names)))
+            result.append(trip)
+    elif strategy == 'first_fit_decreasing':
+        # Segment tree holding the most room left over each range of trips,
+        # so the first trip with enough room is found in O(log n)
+        size = 1
+        while size < len(names):
+            size *= 2
+        mostRoom = [-1] * (2 * size)
+        for i in order:
+            weight = weights[i]
+            if mostRoom[1] >= weight:
+                node = 1
+                while node < size:
+                    node *= 2
+                    if mostRoom[node] < weight:
+                        node += 1
+                result[node - size].append(names[i])
+                mostRoom[node] -= weight
+            else:
+                node = size + len(result)
+                result.append([names[i]])
+                mostRoom[node] = limit - weight
+            node //= 2
+            while node >= 1:
+                mostRoom[node] = max(mostRoom[2 * node],
+                                     mostRoom[2 * node + 1])
+                node //= 2
+    elif strategy == 'best_fit_decreasing' and \
+            limit <= max(1 << 16, 16 * len(names)):
+        # Fenwick tree counting the trips with each room left from 0 to
+        # limit (count of room r at index r + 1), so the least room that
+        # still fits a cow is found in O(log limit), with the trip numbers
+        # having each room kept in heaps so ties go to the first trip
+        trips = {}
+        counts = [0] * (limit + 2)
+        top = 1
+        while 2 * top < len(counts):
+            top *= 2
+        for i in order:
+            weight = weights[i]
+            # Trips with less room than the cow
+            node, smaller = weight, 0
+            while node > 0:
+                smaller += counts[node]
+                node -= node & -node
+            # Least room with more trips than that at or below it
+            node, step, seen = 0, top, 0
+            while step > 0:
+                if node + step < len(counts) and \
+                        seen + counts[node + step] <= smaller:
+                    node += step
+                    seen += counts[node]
+                step //= 2
+            if node < len(counts) - 1:
+                room = node
+                trip = heapq.heappop(trips[room])
+                result[trip].append(names[i])
+                node = room + 1
+                while node < len(counts):
+                    counts[node] -= 1
+                    node += node & -node
+            else:
+                room, trip = limit, len(result)
+                result.append([names[i]])
+            heapq.heappush(trips.setdefault(room - weight, []), trip)
+            node = room - weight + 1
+            while node < len(counts):
+                counts[node] += 1
+                node += node & -node
+    elif strategy == 'best_fit_decreasing':
+        # Limits too large for a tree over every room: (room left, trip
+        # number) of every trip, least room first, O(n) per insertion
+        rooms = []
+        for i in order:
+            weight = weights[i]
+            k = bisect.bisect_left(rooms, (weight, -1))
+            if k < len(rooms):
+                room, trip = rooms.pop(k)
+                result[trip].append(names[i])
+            else:
+                room, trip = limit, len(result)
+                result.append([names[i]])
+            bisect.insort(rooms, (room - weight, trip))
+    else:
+        raise ValueError('Unknown greedy strategy: %r' % (strategy,))
+    return result
+
+
+def greedy_cow_transport(cows, limit=10, strategy='largest', certify=False):
     """
     Uses a greedy heuristic to determine an allocation of cows that attempts to
     minimize the number of spaceship trips needed to transport all the cows.
     The returned allocation of cows may or may not be optimal.
-    The greedy heuristic follows the following method:
+    The greedy heuristic follows one of the following methods, chosen by
+    strategy:
 
+    'largest' (the default):
     1. As long as the current trip can fit another cow, add the largest cow
     that will fit to the trip.
     2. Once the trip is full, begin a new trip to transport the remaining cows.
 
+    'first_fit_decreasing':
+    Take the cows from largest to smallest and put each one on the first trip
+    that still has room for it, beginning a new trip when none has.
+
+    'best_fit_decreasing':
+    Take the cows from largest to smallest and put each one on the trip with
+    the least room left that still fits it, beginning a new trip when none
+    does.
+
+    Every method runs in O(n log n) for n cows: 'largest' bisects a sorted list
+    of the cows and skips the ones already taken with union-find links,
+    'first_fit_decreasing' keeps the most room left over ranges of trips in a
+    segment tree, and 'best_fit_decreasing' counts the trips with each room
+    left in a Fenwick tree, which takes O(limit) memory, so for limits above
+    both 2**16 and 16 times the number of cows it keeps a sorted list of the
+    rooms instead, O(n) per cow. Assumes no cow is heavier than the limit.
     Does not mutate the given dictionary of cows.
 
     Parameters:
     cows - a dictionary of name (string), weight (int) pairs
     limit - weight limit of the spaceship (an int)
+    strategy - 'largest', 'first_fit_decreasing' or 'best_fit_decreasing'
+    certify - whether to also return if the allocation is proven optimal
 
     Returns:
     A list of lists, with each inner list containing the names of cows
     transported on a particular trip and the overall list containing all the
-    trips
+    trips. If certify is True, a tuple of that list and True when it uses as
+    few trips as the lower bound from ps1_bounds (so it is optimal), False
+    when it may not be optimal
     """
-    cowsLeft = dict(cows)
-    result = []
-    while cowsLeft != {}:
-        trip = []
-        totalWeight = 0
-        for i in sorted(cowsLeft, key=cowsLeft.get)[::-1]:
-            if (totalWeight + cowsLeft[i]) <= limit:
-                trip.append(i)
-                totalWeight += cowsLeft[i]
-                del cowsLeft[i]
-        result.append(trip)
-    return result
+    if certify:
+        result = greedy_cow_transport(cows, limit, strategy)
+        return result, len(result) == lower_bound(cows.values(), limit)
+    names = list(cows)
+    weights = list(cows.values())
+    return pack_cows(names, weights, sort_cows(weights), limit, strategy)
 
 
-def brute_force_cow_transport(cows, limit=10):
+def brute_force_cow_transport(cows, limit=10, workers=None, certify=False):
     """
     Finds the allocation of cows that minimizes the number of spaceship trips
     via brute force.  The brute force algorithm follows the following method:
 
-    1. Enumerate all possible ways that the cows can be divided into separate
-    trips.
-    2. Select the allocation that minimizes the number of trips without making
-    any trip that does not obey the weight limitation.
+    1. Enumerate the ways that the cows can be divided into separate trips
+    that all obey the weight limitation, from fewest trips to most, starting
+    at the lower bound from ps1_bounds and skipping any partial division that
+    already has a trip over the limit.
+    2. Select the first allocation found, which minimizes the number of trips.
+
+    The weight of every possible trip is computed once up front into a table
+    indexed by bitmask, so checking a trip against the limit is a lookup, and
+    sets of cows already found not to fit in some number of trips are
+    remembered and not searched again.
+
+    If workers is given, the divisions are instead split up by their first
+    trip into shards that are searched by that many worker processes, one
+    number of trips at a time: every shard is searched for divisions into
+    that many trips before any shard moves on to one more, and the workers
+    stop as soon as one of them finds a division. The number of trips
+    returned is the same as with a single process. Starting the workers and
+    copying the table to them costs a few tenths of a second, so this only
+    pays off for herds that take seconds to search.
 
     Does not mutate the given dictionary of cows.
 
     Parameters:
     cows - a dictionary of name (string), weight (int) pairs
     limit - weight limit of the spaceship (an int)
+    workers - number of worker processes to search with (an int), or None to
+    search in this process
+    certify - whether to also return if the allocation is proven optimal
 
     Returns:
     A list of lists, with each inner list containing the names of cows
     transported on a particular trip and the overall list containing all the
-    trips
+    trips. If certify is True, a tuple of that list and True (the search
+    proves it optimal), or of an empty list and False when no allocation
+    exists
     """
-    listCows = list(get_partitions(cows))
-    numberOfTrips = len(cows.keys()) + 1
-    result = []
-    for i in range(len(listCows)):
-        if len(listCows[i]) < numberOfTrips:
-            for j in range(len(listCows[i])):
-                totalWeight = 0
-                weightExceeded = False
-                for k in listCows[i][j]:
-                    totalWeight += cows[k]
-                    if totalWeight > limit:
-                        weightExceeded = True
-                        break
-                if weightExceeded:
-                    break
-            if not weightExceeded:
-                numberOfTrips = len(listCows[i])
-                result = list(listCows[i])
-    return result
+    if certify:
+        result = brute_force_cow_transport(cows, limit, workers)
+        return result, result != [] or len(cows) == 0
+    if workers is None:
+        return next(get_feasible_partitions(cows, limit), [])
+    herd = sorted(cows.items(), key=lambda cow: cow[1], reverse=True)
+    if herd == [] or herd[0][1] > limit:
+        return []
+    weights = [weight for name, weight in herd]
+    bound = lower_bound(weights, limit)
+    # The greedy allocation is always beaten or matched, so a plan is found
+    best = multiprocessing.Value('i',
+                                 len(greedy_cow_transport(cows, limit)) + 1)
+    table = subset_weights(weights)
+    if isinstance(table, array.array):
+        # Workers share one copy of the table instead of one each
+        sharedTable = multiprocessing.RawArray('q', len(table))
+        memoryview(sharedTable).cast('B').cast('q')[:] = table
+    else:
+        sharedTable = weights
+    shards = min(8 * workers, 1 << (len(herd) - 1))
+    with ProcessPoolExecutor(workers, initializer=init_shard_search,
+                             initargs=(len(weights), sharedTable, limit,
+                                       best)) as pool:
+        # Every shard is done with a number of trips before any starts on
+        # the next, so the first number with a plan is the fewest
+        for count in range(bound, best.value):
+            plans = [plan for plan in
+                     pool.map(search_shard, range(shards), [shards] * shards,
+                              [count] * shards)
+                     if plan is not None]
+            if plans != []:
+                break
+    plan = plans[0]
+    return [[herd[i][0] for i in range(len(herd)) if block >> i & 1]
+            for block in plan]
+
+
+def exact_cow_transport(cows, limit=10, certify=False, known=None):
+    """
+    Finds the allocation of cows that minimizes the number of spaceship trips
+    using branch and bound instead of enumerating every partition. The search
+    follows the following method:
+
+    1. Take the greedy allocation as the best allocation found so far.
+    2. Build one trip at a time around the heaviest cow left, trying every way
+    of filling the rest of that trip that leaves no room for another cow.
+    3. Abandon any branch whose lower bound on the number of trips is not
+    better than the best allocation found so far.
+
+    The search stops as soon as it finds an allocation that uses as few trips
+    as the lower bound from ps1_bounds, which is often the greedy one.
+
+    Same input and output as brute_force_cow_transport, so it can be used in
+    its place for herds far too big to enumerate (25-30 cows). Returns an
+    empty list when some cow is heavier than the limit. Does not mutate the
+    given dictionary of cows.
+
+    Parameters:
+    cows - a dictionary of name (string), weight (int) pairs
+    limit - weight limit of the spaceship (an int)
+    certify - whether to also return if the allocation is proven optimal
+    known - an allocation of the cows that obeys the limit (a list of lists),
+    taken as the best found so far if it uses fewer trips than the greedy one
+
+    Returns:
+    A list of lists, with each inner list containing the names of cows
+    transported on a particular trip and the overall list containing all the
+    trips. If certify is True, a tuple of that list and True (the search
+    proves it optimal), or of an empty list and False when no allocation
+    exists
+    """
+    if certify:
+        result = exact_cow_transport(cows, limit, known=known)
+        return result, result != [] or len(cows) == 0
+    herd = sorted(cows.items(), key=lambda cow: cow[1], reverse=True)
+    if herd == [] or herd[0][1] > limit:
+        return []
+    names = [name for name, weight in herd]
+    weights = [weight for name, weight in herd]
+    best = greedy_cow_transport(cows, limit)
+    if known is not None and len(known) < len(best):
+        best = [list(trip) for trip in known]
+    trips = []
+    provenTrips = {}
+
+    def completions(rest, room):
+        chosen = []
+
+        def extend(k, room, smallestSkipped):
+            if k == len(rest):
+                if smallestSkipped > room:
+                    yield list(chosen)
+                return
+            i = rest[k]
+            if weights[i] <= room:
+                chosen.append(i)
+                yield from extend(k + 1, room - weights[i], smallestSkipped)
+                chosen.pop()
+            # Skipping a cow means skipping every later cow of the same weight
+            skip = k
+            while skip < len(rest) and weights[rest[skip]] == weights[i]:
+                skip += 1
+            yield from extend(skip, room, weights[i])
+
+        yield from extend(0, room, limit + 1)
+
+    def search(rest):
+        nonlocal best
+        if rest == []:
+            best = [[names[k] for k in trip] for trip in trips]
+            return
+        key = tuple(weights[i] for i in rest)
+        bound = max(lower_bound(key, limit), provenTrips.get(key, 0))
+        if len(trips) + bound >= len(best):
+            return
+        first = rest[0]
+        room = limit - weights[first]
+        options = completions(rest[1:], room)
+        fits = [i for i in rest[1:] if weights[i] <= room]
+        # When no two cows fit next to the first one (or one fills the trip
+        # exactly), pairing it with the heaviest cow that fits is optimal
+        if fits != [] and (len(fits) == 1 or weights[fits[0]] == room or
+                           weights[fits[-1]] + weights[fits[-2]] > room):
+            options = [[fits[0]]]
+        for trip in options:
+            trips.append([first] + trip)
+            taken = set(trip)
+            search([i for i in rest[1:] if i not in taken])
+            trips.pop()
+            if len(trips) + bound >= len(best):
+                return
+        provenTrips[key] = max(bound, len(best) - len(trips))
+
+    search(list(range(len(names))))
+    return best
+
+
+def batch_cow_transport(cows, limits, method='greedy', strategy='largest'):
+    """
+    Plans the transport of the same herd for each of several spaceship
+    weight limits in one pass, sharing the work that does not depend on the
+    limit instead of calling a transport function once per limit:
+
+    - the herd is sorted once and every greedy plan packs that same order;
+    - brute force looks the weight of every trip up in one subset weight
+    table (see ps1_partition.subset_weights) built for the first limit;
+    - limits are planned from smallest to largest, and since any allocation
+    that obeys one limit obeys every larger one, the optimal plan for the
+    previous limit is kept whenever it already meets the lower bound for the
+    next one, and otherwise bounds the search for it from above.
+
+    A limit that some cow is heavier than gets an empty allocation. Does not
+    mutate the given dictionary of cows.
+
+    Parameters:
+    cows - a dictionary of name (string), weight (int) pairs
+    limits - weight limits of the spaceships (ints)
+    method - 'greedy' (see greedy_cow_transport), 'brute_force' or 'exact'
+    (both optimal, see brute_force_cow_transport and exact_cow_transport)
+    strategy - the greedy strategy to use when method is 'greedy'
+
+    Returns:
+    a dictionary mapping each limit to its allocation, a list of lists like
+    the one returned by the transport functions
+    """
+    names = list(cows)
+    weights = list(cows.values())
+    order = sort_cows(weights)
+    table = None
+    plans = {}
+    previous = None
+    for limit in sorted(set(limits)):
+        # No allocation obeys a limit below the heaviest cow
+        if order == [] or weights[order[0]] > limit:
+            plans[limit] = []
+            continue
+        if method == 'greedy':
+            plans[limit] = pack_cows(names, weights, order, limit, strategy)
+            continue
+        if previous is not None and len(previous) == lower_bound(weights,
+                                                                 limit):
+            plan = previous
+        elif method == 'brute_force':
+            if table is None:
+                table = subset_weights([weights[i] for i in order])
+            most = None if previous is None else len(previous) - 1
+            plan = next(get_feasible_partitions(cows, limit, most, table),
+                        previous)
+        elif method == 'exact':
+            plan = exact_cow_transport(cows, limit, known=previous)
+        else:
+            raise ValueError('Unknown transport method: %r' % (method,))
+        plans[limit] = [list(trip) for trip in plan]
+        previous = plan
+    return {limit: plans[limit] for limit in limits}
+
+
+class CowTransportPlanner(object):
+    """
+    Keeps an allocation of a herd into trips up to date while cows are added,
+    removed or change weight, moving as few cows as it can instead of
+    planning the whole herd again after every change.
+
+    After each change the allocation is repaired locally: a new or heavier
+    cow goes on the trip with the least room left that fits it, and when a
+    cow leaves or gets lighter the emptiest trip is split up over the others
+    if they can take all of its cows. The whole herd is only planned again
+    when the repaired allocation falls further behind the lower bound from
+    ps1_bounds than the last full plan was.
+    """
+    def __init__(self, cows, limit=10, method='greedy',
+                 strategy='best_fit_decreasing'):
+        """
+        Plans the transport of the given herd.
+
+        cows - a dictionary of name (string), weight (int) pairs, e.g. from
+        load_cows (it is copied, not kept)
+        limit - weight limit of the spaceship (an int)
+        method - how full plans are made: 'greedy', 'brute_force' or 'exact'
+        strategy - the greedy strategy to use when method is 'greedy'
+        """
+        self.cows = dict(cows)
+        self.limit = limit
+        self.method = method
+        self.strategy = strategy
+        self.recomputes = 0
+        self.recompute()
+
+    def recompute(self):
+        """
+        Plans the whole herd again from scratch.
+        """
+        if self.method == 'greedy':
+            trips = greedy_cow_transport(self.cows, self.limit, self.strategy)
+        elif self.method == 'brute_force':
+            trips = brute_force_cow_transport(self.cows, self.limit)
+        elif self.method == 'exact':
+            trips = exact_cow_transport(self.cows, self.limit)
+        else:
+            raise ValueError('Unknown transport method: %r' % (self.method,))
+        # Trips are kept by number so removing one does not renumber others
+        self.trips = dict(enumerate(trips))
+        self.loads = {}
+        self.tripOf = {}
+        for number, trip in self.trips.items():
+            self.loads[number] = sum(self.cows[name] for name in trip)
+            for name in trip:
+                self.tripOf[name] = number
+        self.nextTrip = len(trips)
+        self.gap = len(trips) - self.get_lower_bound()
+        self.recomputes += 1
+
+    def get_trips(self):
+        """
+        Returns the current allocation: a list of lists, with each inner list
+        containing the names of cows transported on a particular trip.
+        """
+        return [list(self.trips[number]) for number in sorted(self.trips)]
+
+    def get_lower_bound(self):
+        """
+        Returns the lower bound on the number of trips for the current herd.
+        """
+        return lower_bound(self.cows.values(), self.limit)
+
+    def is_optimal(self):
+        """
+        Returns True if the current allocation is proven optimal.
+        """
+        return len(self.trips) == self.get_lower_bound()
+
+    def add_cow(self, name, weight):
+        """
+        Adds a cow (which must not be in the herd yet) to the herd.
+
+        name - the name of the cow (a string)
+        weight - the weight of the cow (an int, at most the limit)
+        """
+        if name in self.cows:
+            raise ValueError('Cow already in the herd: %r' % (name,))
+        if weight > self.limit:
+            raise ValueError('Cow %r is heavier than the limit' % (name,))
+        self.cows[name] = weight
+        self.place(name)
+        self.repaired()
+
+    def remove_cow(self, name):
+        """
+        Removes a cow from the herd.
+
+        name - the name of the cow (a string)
+        """
+        self.unplace(name)
+        del self.cows[name]
+        self.consolidate()
+        self.repaired()
+
+    def change_weight(self, name, weight):
+        """
+        Changes the weight of a cow in the herd.
+
+        name - the name of the cow (a string)
+        weight - the new weight of the cow (an int, at most the limit)
+        """
+        if weight > self.limit:
+            raise ValueError('Cow %r is heavier than the limit' % (name,))
+        number = self.tripOf[name]
+        change = weight - self.cows[name]
+        if self.loads[number] + change <= self.limit:
+            self.loads[number] += change
+            self.cows[name] = weight
+        else:
+            self.unplace(name)
+            self.cows[name] = weight
+            self.place(name)
+        if change < 0:
+            self.consolidate()
+        self.repaired()
+
+    def place(self, name, avoid=None):
+        """
+        Puts a cow on the trip (other than avoid) with the least room left
+        that fits it, or on a new trip if none does.
+        """
+        weight = self.cows[name]
+        fits = [number for number in self.trips if number != avoid and
+                self.loads[number] + weight <= self.limit]
+        if fits != []:
+            number = max(fits, key=lambda number: self.loads[number])
+        else:
+            number = self.nextTrip
+            self.nextTrip += 1
+            self.trips[number] = []
+            self.loads[number] = 0
+        self.trips[number].append(name)
+        self.loads[number] += weight
+        self.tripOf[name] = number
+
+    def unplace(self, name):
+        """
+        Takes a cow off its trip, dropping the trip if it is left empty.
+        """
+        number = self.tripOf.pop(name)
+        self.trips[number].remove(name)
+        self.loads[number] -= self.cows[name]
+        if self.trips[number] == []:
+            del self.trips[number]
+            del self.loads[number]
+
+    def consolidate(self):
+        """
+        Splits the emptiest trip up over the other trips if they have room
+        for all of its cows.
+        """
+        if len(self.trips) <= self.get_lower_bound():
+            return
+        emptiest = min(self.trips, key=lambda number: self.loads[number])
+        room = {number: self.limit - self.loads[number]
+                for number in self.trips if number != emptiest}
+        moves = []
+        for name in sorted(self.trips[emptiest], key=self.cows.get,
+                           reverse=True):
+            fits = [number for number in room
+                    if room[number] >= self.cows[name]]
+            if fits == []:
+                return
+            number = min(fits, key=room.get)
+            room[number] -= self.cows[name]
+            moves.append((name, number))
+        for name, number in moves:
+            self.unplace(name)
+            self.trips[number].append(name)
+            self.loads[number] += self.cows[name]
+            self.tripOf[name] = number
+
+    def repaired(self):
+        """
+        Plans the whole herd again if the local repair fell behind the lower
+        bound by more than the last full plan did.
+        """
+        if len(self.trips) - self.get_lower_bound() > self.gap:
+            self.recompute()
+
+
+def generate_herd(size, distribution='uniform', limit=10, seed=0):
+    """
+    Generate a synthetic herd for benchmarking, the same every time for the
+    same arguments.
+
+    Parameters:
+    size - number of cows (an int)
+    distribution - how the weights are drawn: 'uniform' (1 to limit), 'small'
+    (1 to a quarter of limit), 'large' (half of limit to limit) or 'thirds'
+    (just over a quarter to half of limit, which makes for hard packings)
+    limit - weight limit of the spaceship the herd is meant for (an int)
+    seed - seed for the random weights
+
+    Returns:
+    a dictionary of cow name (string), weight (int) pairs
+    """
+    ranges = {'uniform': (1, limit),
+              'small': (1, max(1, limit // 4)),
+              'large': (max(1, limit // 2), limit),
+              'thirds': (limit // 4 + 1, max(limit // 4 + 1, limit // 2))}
+    low, high = ranges[distribution]
+    rng = random.Random('%s:%s:%s:%s' % (size, distribution, limit, seed))
+    return {'Cow %d' % i: rng.randint(low, high) for i in range(size)}
+
+
+def benchmark_cow_transport(sizes=(8, 10, 20, 30, 1000),
+                            distributions=('uniform', 'small', 'large',
+                                           'thirds'),
+                            limit=100, seeds=(0, 1, 2), workers=None,
+                            brute_force_max=10, exact_max=30,
+                            history_file='ps1_benchmark_history.json',
+                            label=None, tolerance=0.25, repeats=5,
+                            min_change=0.001):
+    """
+    Runs every transport solver on seeded synthetic herds and records how
+    long it took (the best of repeats runs, like timeit, as the others only
+    add noise from the rest of the machine), its peak memory, the number of
+    trips and the gap between that number and the optimum (or, for herds too
+    big for the exact solvers, the lower bound from ps1_bounds).
+
+    The run is appended to the JSON list in history_file and compared with
+    the previous run stored there: any solver that got slower both by more
+    than tolerance and by more than min_change seconds, or needed more trips,
+    on the same herd is reported as a regression. The floor keeps the timer's
+    jitter on solvers that take microseconds from being reported.
+
+    Parameters:
+    sizes - herd sizes to try (ints)
+    distributions - weight distributions to try (see generate_herd)
+    limit - weight limit of the spaceship (an int)
+    seeds - seeds to generate each size and distribution of herd with
+    workers - if given, also run brute_force_cow_transport with this many
+    worker processes (whose memory is not counted)
+    brute_force_max - largest herd to run brute force on (an int)
+    exact_max - largest herd to run exact_cow_transport on (an int)
+    history_file - JSON file keeping every run, or None to not keep it
+    label - name for this run in the history (a string), e.g. a version
+    tolerance - fraction a solver can slow down by before it is reported
+    repeats - times to run each solver on each herd (an int > 0)
+    min_change - seconds a solver can slow down by before it is reported
+
+    Returns:
+    a tuple of the list of result dictionaries of this run and the list of
+    regressions (strings) found against the previous run
+    """
+    assert repeats > 0
+    solvers = [('greedy_' + strategy, 0,
+                functools.partial(greedy_cow_transport, limit=limit,
+                                  strategy=strategy))
+               for strategy in ('largest', 'first_fit_decreasing',
+                                'best_fit_decreasing')]
+    solvers.append(('brute_force', brute_force_max,
+                    functools.partial(brute_force_cow_transport,
+                                      limit=limit)))
+    solvers.append(('exact', exact_max,
+                    functools.partial(exact_cow_transport, limit=limit)))
+    if workers is not None:
+        solvers.append(('brute_force_workers_%d' % workers, brute_force_max,
+                        functools.partial(brute_force_cow_transport,
+                                          limit=limit, workers=workers)))
+    results = []
+    for size in sizes:
+        for distribution in distributions:
+            for seed in seeds:
+                cows = generate_herd(size, distribution, limit, seed)
+                runs = []
+                for name, maxSize, solver in solvers:
+                    if maxSize and size > maxSize:
+                        continue
+                    seconds = float('inf')
+                    for i in range(repeats):
+                        start = time.perf_counter()
+                        trips = solver(cows)
+                        seconds = min(seconds, time.perf_counter() - start)
+                    # Memory is measured on a second run, as tracing slows
+                    # the solver down
+                    tracemalloc.start()
+                    solver(cows)
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    runs.append({'size': size, 'distribution': distribution,
+                                 'seed': seed, 'limit': limit,
+                                 'solver': name, 'seconds': seconds,
+                                 'peak_bytes': peak, 'trips': len(trips)})
+                optimum = [run['trips'] for run in runs
+                           if run['solver'] in ('exact', 'brute_force')]
+                if optimum != []:
+                    reference, kind = optimum[0], 'optimum'
+                else:
+                    reference = lower_bound(cows.values(), limit)
+                    kind = 'lower_bound'
+                for run in runs:
+                    run['reference'] = kind
+                    run['gap'] = run['trips'] - reference
+                results.extend(runs)
+    regressions = []
+    if history_file is not None:
+        history = []
+        if os.path.exists(history_file):
+            with open(history_file, 'r') as f:
+                history = json.load(f)
+        if history != []:
+            key = operator.itemgetter('size', 'distribution', 'seed', 'limit',
+                                      'solver')
+            previous = {key(run): run for run in history[-1]['results']}
+            for run in results:
+                old = previous.get(key(run))
+                if old is None:
+                    continue
+                # Line bellow broken to comply with pep8
+                if run['seconds'] > old['seconds'] * (1 + tolerance) and \
+                        run['seconds'] > old['seconds'] + min_change:
+                    regressions.append(
+                        '%s on %s: %.4fs -> %.4fs' % (
+                            run['solver'], key(run)[:4], old['seconds'],
+                            run['seconds']))
+                if run['trips'] > old['trips']:
+                    regressions.append(
+                        '%s on %s: %d -> %d trips' % (
+                            run['solver'], key(run)[:4], old['trips'],
+                            run['trips']))
+        history.append({'label': label, 'time': time.time(),
+                        'python': sys.version.split()[0],
+                        'results': results})
+        with open(history_file, 'w') as f:
+            json.dump(history, f, indent=1)
+    return results, regressions
 
 
-cows = load_cows("ps1_cow_data.txt")
-limit = 15
+# Worker processes may import this file, so only run the example directly
+if __name__ == '__main__':
+    cows = load_cows("ps1_cow_data.txt")
+    limit = 15
 
+    print(greedy_cow_transport(cows, limit))
+    print(brute_force_cow_transport(cows, limit))
+    print(exact_cow_transport(cows, limit))
 
-print(greedy_cow_transport(cows, limit))
-print(brute_force_cow_transport(cows, limit))
+    # Uncomment the lines bellow to benchmark every solver
+    # results, regressions = benchmark_cow_transport()
+    # print('\n'.join(regressions) or 'No regressions')
@@ -2,10 +2,21 @@
 # Problem Set 2
 # Simulating robots
 
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from random_supply import RandomSupply
+from statistics import NormalDist
+import array
+import json
 import ps2_visualize
 import pylab
 import math
+import mmap
+import numpy as np
+import os
 import random
+import struct
+import time
 
 random.seed(9000)  # Comment this out to get random walks
 
@@ -23,10 +34,34 @@ def testRobotMovement(robot_type, room_type, delay=0.4):
     anim.done()
 
 
+# Tables of the change in position for each whole-degree direction, by speed
+deltaTables = {}
+
+
+def getDeltaTable(speed):
+    """
+    Returns a list of 360 (delta_x, delta_y) pairs, one for each whole-degree
+    direction, giving the change in position after a single clock-tick at
+    speed SPEED. The pairs are computed exactly as in getNewPosition, so
+    adding them gives the same positions to the last bit.
+
+    speed: positive float representing speed
+    """
+    if speed not in deltaTables:
+        # Line bellow broken to comply with pep8
+        deltaTables[speed] = [
+            (speed * math.sin(math.radians(float(angle))),
+             speed * math.cos(math.radians(float(angle))))
+            for angle in range(360)]
+    return deltaTables[speed]
+
+
 class Position(object):
     """
     A Position represents a location in a two-dimensional room.
     """
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         """
         Initializes a position with coordinates (x, y).
@@ -74,8 +109,21 @@ class RectangularRoom(object):
 
     A room has a width and a height and contains (width * height) tiles. At any
     particular time, each of these tiles is either clean or dirty.
+
+    The tiles are kept in a flat bytearray, one byte per tile in row order,
+    along with a running count of the cleaned tiles that only changes when a
+    tile goes from dirty to clean, so getNumTiles and getNumCleanedTiles take
+    constant time.
+
+    The room also holds the random number generator that positions in it and
+    the robots cleaning it draw from, so that each trial of a simulation can
+    use a stream of its own.
+
+    Once enableCleanLog has been called, the room also lists every tile it
+    marks as cleaned, so a viewer or recorder can pick up just the tiles that
+    changed.
     """
-    def __init__(self, width, height):
+    def __init__(self, width, height, rng=None):
         """
         Initializes a rectangular room with the specified width and height.
 
@@ -83,6 +131,8 @@ class RectangularRoom(object):
 
         width: an integer > 0
         height: an integer > 0
+        rng: a random.Random or RandomSupply to draw from, or None for the
+             random module
         """
         assert width > 0
         assert type(width) == int
@@ -91,9 +141,21 @@ class RectangularRoom(object):
 
         self.width = width
         self.height = height
-        # Line bellow broken to comply with pep8
-        self.room = [[False for x in range(self.width)] for y in
-                     range(self.height)]
+        self.tiles = bytearray(width * height)
+        self.numCleanedTiles = 0
+        self.rng = random if rng is None else rng
+        self.cleanLog = None
+
+    def enableCleanLog(self):
+        """
+        Start listing in self.cleanLog the index (y * width + x) of each tile
+        cleanTileAtPosition marks as cleaned from now on, in order, unless the
+        list has already been started. The list only ever grows (to at most
+        one entry per tile), so any number of readers can follow it, each
+        remembering how many entries it has read; no reader may empty it.
+        """
+        if self.cleanLog is None:
+            self.cleanLog = []
 
     def cleanTileAtPosition(self, pos):
         """
@@ -103,7 +165,12 @@ class RectangularRoom(object):
 
         pos: a Position
         """
-        self.room[math.floor(pos.getY())][math.floor(pos.getX())] = True
+        tile = math.floor(pos.getY()) * self.width + math.floor(pos.getX())
+        if not self.tiles[tile]:
+            self.tiles[tile] = 1
+            self.numCleanedTiles += 1
+            if self.cleanLog is not None:
+                self.cleanLog.append(tile)
 
     def isTileCleaned(self, m, n):
         """
@@ -115,7 +182,7 @@ class RectangularRoom(object):
         n: an integer
         returns: True if (m, n) is cleaned, False otherwise
         """
-        return self.room[n][m]
+        return self.tiles[n * self.width + m] == 1
 
     def getNumTiles(self):
         """
@@ -123,7 +190,7 @@ class RectangularRoom(object):
 
         returns: an integer
         """
-        return sum([len(x) for x in self.room])
+        return len(self.tiles)
 
     def getNumCleanedTiles(self):
         """
@@ -131,7 +198,7 @@ class RectangularRoom(object):
 
         returns: an integer
         """
-        return sum([x.count(True) for x in self.room])
+        return self.numCleanedTiles
 
     def getRandomPosition(self):
         """
@@ -140,8 +207,8 @@ class RectangularRoom(object):
         returns: a Position object.
         """
         # Line bellow broken to comply with pep8
-        return Position(random.randrange(0, self.width),
-                        random.randrange(0, self.height))
+        return Position(self.rng.randrange(0, self.width),
+                        self.rng.randrange(0, self.height))
 
     def isPositionInRoom(self, pos):
         """
@@ -155,13 +222,271 @@ class RectangularRoom(object):
         return (pos.getX() < self.width and pos.getY() < self.height)
 
 
+def countBits(words):
+    """
+    Return the number of bits set in WORDS, an array('Q'), counting a large
+    block of words at a time.
+    """
+    count = 0
+    for start in range(0, len(words), 1 << 16):
+        block = int.from_bytes(words[start:start + (1 << 16)], 'little')
+        count += bin(block).count('1')
+    return count
+
+
+def setBits(words, start, stop):
+    """
+    Set bits START up to (but not including) STOP of WORDS, an array('Q'),
+    a whole word at a time where possible.
+    """
+    full = (1 << 64) - 1
+    while start < stop:
+        word = start >> 6
+        low = start & 63
+        high = min(64, stop - (word << 6))
+        words[word] |= full >> (64 - high + low) << low
+        start = (word + 1) << 6
+
+
+def makeObstacleMask(width, height, rectangles):
+    """
+    Return an obstacle mask for a BitsetRoom of dimensions WIDTH x HEIGHT
+    in which the tiles of each rectangle (x1, y1, x2, y2), going from tile
+    (x1, y1) up to (but not including) column x2 and row y2, are obstacles.
+
+    returns: an array('Q') with bit y * width + x set for each obstacle tile
+    """
+    words = array.array('Q', [0]) * ((width * height + 63) // 64)
+    for x1, y1, x2, y2 in rectangles:
+        assert 0 <= x1 <= x2 <= width and 0 <= y1 <= y2 <= height
+        for y in range(y1, y2):
+            setBits(words, y * width + x1, y * width + x2)
+    return words
+
+
+class BitsetRoom(RectangularRoom):
+    """
+    A BitsetRoom is a RectangularRoom for very large floor plans. It keeps one
+    bit per tile, packed 64 to a word in row order (bit y * width + x), so a
+    20000 x 20000 room takes 50MB.
+
+    A room can also have obstacles: tiles, given as a mask in the same
+    layout, that robots cannot enter and that do not count among the room's
+    tiles when working out coverage.
+    """
+    def __init__(self, width, height, rng=None, obstacles=None):
+        """
+        Initializes a room with the specified width and height and
+        obstacles.
+
+        Initially, no tiles in the room have been cleaned.
+
+        width: an integer > 0
+        height: an integer > 0
+        rng: a random.Random or RandomSupply to draw from, or None for the
+             random module
+        obstacles: an array('Q') of obstacle bits (see makeObstacleMask), or
+                   None for no obstacles
+        """
+        assert width > 0
+        assert type(width) == int
+        assert height > 0
+        assert type(height) == int
+
+        self.width = width
+        self.height = height
+        words = (width * height + 63) // 64
+        self.cleanedWords = array.array('Q', [0]) * words
+        self.obstacles = obstacles
+        self.numTiles = width * height
+        if obstacles is not None:
+            assert len(obstacles) == words
+            # Line bellow broken to comply with pep8
+            assert (width * height % 64 == 0 or
+                    obstacles[-1] >> (width * height % 64) == 0)
+            self.numTiles -= countBits(obstacles)
+            assert self.numTiles > 0
+        self.numCleanedTiles = 0
+        self.rng = random if rng is None else rng
+        self.cleanLog = None
+
+    def cleanTileAtPosition(self, pos):
+        """
+        Mark the tile under the position POS as cleaned.
+
+        Assumes that POS represents a valid position inside this room.
+
+        pos: a Position
+        """
+        tile = math.floor(pos.getY()) * self.width + math.floor(pos.getX())
+        bit = 1 << (tile & 63)
+        if not self.cleanedWords[tile >> 6] & bit:
+            self.cleanedWords[tile >> 6] |= bit
+            self.numCleanedTiles += 1
+            if self.cleanLog is not None:
+                self.cleanLog.append(tile)
+
+    def isTileCleaned(self, m, n):
+        """
+        Return True if the tile (m, n) has been cleaned.
+
+        Assumes that (m, n) represents a valid tile inside the room.
+
+        m: an integer
+        n: an integer
+        returns: True if (m, n) is cleaned, False otherwise
+        """
+        tile = n * self.width + m
+        return self.cleanedWords[tile >> 6] >> (tile & 63) & 1 == 1
+
+    def isTileObstacle(self, m, n):
+        """
+        Return True if the tile (m, n) is an obstacle.
+
+        m: an integer
+        n: an integer
+        returns: True if (m, n) is an obstacle, False otherwise
+        """
+        if self.obstacles is None:
+            return False
+        tile = n * self.width + m
+        return self.obstacles[tile >> 6] >> (tile & 63) & 1 == 1
+
+    def getNumTiles(self):
+        """
+        Return the number of tiles in the room that are not obstacles.
+
+        returns: an integer
+        """
+        return self.numTiles
+
+    def countCleanedTiles(self):
+        """
+        Return the number of clean tiles in the room, counted from the bits
+        rather than kept as they are cleaned (so it always agrees with
+        getNumCleanedTiles).
+
+        returns: an integer
+        """
+        return countBits(self.cleanedWords)
+
+    def getRandomPosition(self):
+        """
+        Return a random position inside the room that is not on an obstacle.
+
+        returns: a Position object.
+        """
+        while True:
+            # Line bellow broken to comply with pep8
+            position = Position(self.rng.randrange(0, self.width),
+                                self.rng.randrange(0, self.height))
+            if not self.isTileObstacle(position.x, position.y):
+                return position
+
+    def isPositionInRoom(self, pos):
+        """
+        Return True if pos is inside the room and not on an obstacle.
+
+        pos: a Position object.
+        returns: True if pos is in the room, False otherwise.
+        """
+        x = pos.getX()
+        y = pos.getY()
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return False
+        if self.obstacles is None:
+            return True
+        tile = int(y) * self.width + int(x)
+        return not self.obstacles[tile >> 6] >> (tile & 63) & 1
+
+
+class SimulationStats(object):
+    """
+    Counters and timings of simulation trials, for finding where the time of
+    a slow simulation goes.
+
+    The counters are the robots' time-steps (steps), how many of those moved
+    the robot (acceptedMoves) and how many were stopped by a wall
+    (rejectedMoves), how many of the stopped ones made the robot turn
+    (wallBounces), and how many of the moves landed on a dirty tile
+    (newlyCleanedTiles) or on a clean one (revisits). The timings are the
+    seconds spent building the room and robots (setup), moving the robots
+    (stepping) and working out the coverage (coverage).
+
+    Besides the totals, the counters and timings of each trial are kept in
+    self.trials, with the trial's cleaning time as timeSteps.
+    """
+    COUNTERS = ('steps', 'acceptedMoves', 'rejectedMoves', 'wallBounces',
+                'newlyCleanedTiles', 'revisits')
+    PHASES = ('setup', 'stepping', 'coverage')
+
+    def __init__(self):
+        """
+        Initializes stats with every counter and timing at zero and no
+        trials.
+        """
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        for name in self.PHASES:
+            setattr(self, name, 0.0)
+        self.trials = []
+
+    def addTrial(self, trial, time_steps):
+        """
+        Adds the counters and timings of a trial that took TIME_STEPS to the
+        totals and to the list of trials.
+
+        trial: a SimulationStats holding the trial's counters and timings
+        time_steps: an int
+        """
+        totals = trial.getTotals()
+        for name in totals:
+            setattr(self, name, getattr(self, name) + totals[name])
+        totals['timeSteps'] = time_steps
+        self.trials.append(totals)
+
+    def merge(self, other):
+        """
+        Adds the totals and trials of OTHER (a SimulationStats), e.g. from
+        another process, to these.
+        """
+        totals = other.getTotals()
+        for name in totals:
+            setattr(self, name, getattr(self, name) + totals[name])
+        self.trials.extend(other.trials)
+
+    def getTotals(self):
+        """
+        Returns a dictionary of every counter and timing.
+        """
+        return {name: getattr(self, name)
+                for name in self.COUNTERS + self.PHASES}
+
+    def toDict(self):
+        """
+        Returns the totals and trials as a dictionary that json can dump.
+        """
+        return {'totals': self.getTotals(), 'trials': self.trials}
+
+    def dump(self, filename):
+        """
+        Writes toDict() to FILENAME as JSON.
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.toDict(), f, indent=1)
+
+
 class Robot(object):
     """
     Represents a robot cleaning a particular room.
 
     At all times the robot has a particular position and direction in the room.
     The robot also has a fixed speed.
+
+    Robots of a type that turns when a wall stops it have bouncesOffWalls set.
     """
+    bouncesOffWalls = False
+
     def __init__(self, room, speed):
         """
         Initializes a Robot with the given speed in the specified room. The
@@ -174,9 +499,84 @@ class Robot(object):
         assert speed > 0 and type(speed) == float
         self.room = room
         self.speed = speed
+        # Robots draw from their room's random stream, if it has one
+        self.rng = getattr(room, 'rng', random)
         self.currentPosition = self.room.getRandomPosition()
-        self.currentDirection = random.randrange(0, 360)
+        self.currentDirection = self.rng.randrange(0, 360)
         self.room.cleanTileAtPosition(self.currentPosition)
+        self.deltas = None
+        self.stats = None
+
+    def enableStats(self, stats):
+        """
+        Start counting the robot's moves in STATS (a SimulationStats). The
+        robot's moveAndClean is replaced by countedMoveAndClean for this
+        robot only, so robots that do not count are not slowed down at all.
+        """
+        self.stats = stats
+        self.moveAndClean = self.countedMoveAndClean
+
+    def countedMoveAndClean(self, direction):
+        """
+        Like moveAndClean, but also counts the move in self.stats.
+        """
+        stats = self.stats
+        stats.steps += 1
+        cleaned = self.room.getNumCleanedTiles()
+        if not Robot.moveAndClean(self, direction):
+            stats.rejectedMoves += 1
+            if self.bouncesOffWalls:
+                stats.wallBounces += 1
+            return False
+        stats.acceptedMoves += 1
+        if self.room.getNumCleanedTiles() > cleaned:
+            stats.newlyCleanedTiles += 1
+        else:
+            stats.revisits += 1
+        return True
+
+    def enableFastPath(self):
+        """
+        Switch the robot to stepping without allocating: moves are looked up
+        in the getDeltaTable table for the robot's speed instead of computed
+        with sin and cos, are checked against the room with a Position kept
+        for the purpose, and update the robot's Position in place (so the
+        Position returned by getRobotPosition follows the robot). Directions
+        that are not whole degrees still go through getNewPosition. The robot
+        moves exactly as it would otherwise.
+        """
+        self.deltas = getDeltaTable(self.speed)
+        self.probe = Position(0, 0)
+        # Line bellow broken to comply with pep8
+        self.currentPosition = Position(self.currentPosition.getX(),
+                                        self.currentPosition.getY())
+
+    def moveAndClean(self, direction):
+        """
+        Move the robot a single time-step in DIRECTION, unless that would take
+        it out of the room, and mark the tile it lands on as cleaned.
+
+        direction: number representing an angle in degrees
+        returns: True if the robot moved, False if it would have left the room
+        """
+        position = self.currentPosition
+        if (self.deltas is not None and type(direction) == int and
+                0 <= direction < 360):
+            delta_x, delta_y = self.deltas[direction]
+            newPosition = self.probe
+            newPosition.x = position.x + delta_x
+            newPosition.y = position.y + delta_y
+            if not self.room.isPositionInRoom(newPosition):
+                return False
+            position.x = newPosition.x
+            position.y = newPosition.y
+        else:
+            newPosition = position.getNewPosition(direction, self.speed)
+            if not self.room.isPositionInRoom(newPosition):
+                return False
+            self.currentPosition = newPosition
+        self.room.cleanTileAtPosition(self.currentPosition)
+        return True
 
     def getRobotPosition(self):
         """
@@ -220,6 +620,8 @@ class StandardRobot(Robot):
     direction; when it would hit a wall, it *instead* chooses a new direction
     randomly.
     """
+    bouncesOffWalls = True
+
     def updatePositionAndClean(self):
         """
         Simulate the passage of a single time-step.
@@ -227,15 +629,8 @@ class StandardRobot(Robot):
         Move the robot to a new position and mark the tile it is on as having
         been cleaned.
         """
-        # Line bellow broken to comply with pep8
-        newPosition = self.currentPosition.getNewPosition(
-                      self.currentDirection, self.speed
-                      )
-        if self.room.isPositionInRoom(newPosition):
-            self.currentPosition = newPosition
-            self.room.cleanTileAtPosition(self.currentPosition)
-        else:
-            self.currentDirection = random.randrange(0, 360)
+        if not self.moveAndClean(self.currentDirection):
+            self.currentDirection = self.rng.randrange(0, 360)
 
 
 # ##Uncomment the line bellow to see StandardRobot in action!
@@ -254,25 +649,471 @@ class RandomWalkRobot(Robot):
         Move the robot to a new position and mark the tile it is on as having
         been cleaned.
         """
-        newDirection = self.currentDirection
-        while newDirection == self.currentDirection:
-            newDirection = random.randrange(0, 360)
+        # Any of the 359 other directions, each as likely
+        newDirection = (self.currentDirection +
+                        self.rng.randrange(1, 360)) % 360
         self.currentDirection = newDirection
-        # Line bellow broken to comply with pep8
-        newPosition = self.currentPosition.getNewPosition(
-                      newDirection, self.speed
-                      )
-        if self.room.isPositionInRoom(newPosition):
-            self.currentPosition = newPosition
-            self.room.cleanTileAtPosition(self.currentPosition)
+        self.moveAndClean(newDirection)
 
 
 # ##Uncomment the line bellow to see StandardRobot in action
 # testRobotMovement(RandomWalkRobot, RectangularRoom)
 
 
+# Header of a trajectory log: magic, room width and height, number of robots
+TRAJECTORY_HEADER = struct.Struct('=8sqqq')
+TRAJECTORY_MAGIC = b'ROBOTS\x00\x01'
+
+
+def trajectoryTickStruct(num_robots):
+    """
+    Returns the struct of one time-step in a trajectory log: the number of
+    tiles cleaned so far, then the x, y and direction of each robot.
+    """
+    return struct.Struct('=q' + 'ddd' * num_robots)
+
+
+class TrajectoryRecorder(object):
+    """
+    Streams a simulation to a pair of append-only binary files that
+    TrajectoryReplay can read back: FILENAME holds a header and then one
+    fixed-width record per time-step, from time-step 0 (the robots as
+    placed) on, and FILENAME + '.tiles' lists the index (y * width + x) of
+    every cleaned tile, in the order they were cleaned, each as a C int in
+    native byte order (array 'i', 4 bytes on common platforms), with no
+    header. Each time-step records how many tiles had been cleaned by then,
+    so any time-step can be found without reading the ones before it.
+
+    Cleaned tiles are read from the room's cleanLog, which the recorder
+    switches on and follows without emptying, so the room can be drawn (e.g.
+    by ps2_visualize.HeadlessRobotVisualization) while it is recorded.
+    """
+    def __init__(self, filename, room, robots):
+        """
+        Starts a log of ROOM and ROBOTS in FILENAME and records time-step 0.
+
+        filename: a string
+        room: a RectangularRoom
+        robots: a list of Robots in ROOM
+        """
+        self.room = room
+        self.robots = robots
+        self.tick = trajectoryTickStruct(len(robots))
+        self.numCleanedTiles = 0
+        self.ticks = open(filename, 'wb')
+        self.tiles = open(filename + '.tiles', 'wb')
+        self.ticks.write(TRAJECTORY_HEADER.pack(
+            TRAJECTORY_MAGIC, room.width, room.height, len(robots)))
+        # The tiles already cleaned are not in cleanLog from here on
+        room.enableCleanLog()
+        self.logged = len(room.cleanLog)
+        self.tiles.write(array.array('i', (
+            j * room.width + i for j in range(room.height)
+            for i in range(room.width) if room.isTileCleaned(i, j))))
+        self.numCleanedTiles = room.getNumCleanedTiles()
+        self.record()
+
+    def record(self):
+        """
+        Appends the current time-step: the tiles cleaned since the last one
+        and where every robot is.
+        """
+        if len(self.room.cleanLog) > self.logged:
+            tiles = self.room.cleanLog[self.logged:]
+            self.tiles.write(array.array('i', tiles))
+            self.numCleanedTiles += len(tiles)
+            self.logged += len(tiles)
+        values = [self.numCleanedTiles]
+        for robot in self.robots:
+            position = robot.getRobotPosition()
+            values.append(position.getX())
+            values.append(position.getY())
+            values.append(robot.getRobotDirection())
+        self.ticks.write(self.tick.pack(*values))
+
+    def close(self):
+        """
+        Flushes and closes the log.
+        """
+        self.ticks.close()
+        self.tiles.close()
+
+
+class RecordedRobot(object):
+    """
+    A robot of a TrajectoryReplay: a position and a direction, as given by
+    the methods of Robot that RobotVisualization uses.
+    """
+    def __init__(self, position, direction):
+        self.position = position
+        self.direction = direction
+
+    def getRobotPosition(self):
+        return self.position
+
+    def getRobotDirection(self):
+        return self.direction
+
+
+class TrajectoryReplay(object):
+    """
+    Reads back a log written by TrajectoryRecorder. Both files are memory
+    mapped, so the state at any time-step is found by looking at its record
+    directly, without replaying the time-steps before it.
+    """
+    def __init__(self, filename):
+        """
+        Opens the log in FILENAME.
+
+        filename: a string
+        """
+        with open(filename, 'rb') as f:
+            self.ticks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.height, self.numRobots = \
+            TRAJECTORY_HEADER.unpack_from(self.ticks)
+        if magic != TRAJECTORY_MAGIC:
+            raise ValueError('%s is not a trajectory log' % filename)
+        self.tick = trajectoryTickStruct(self.numRobots)
+        # Line bellow broken to comply with pep8
+        self.numTicks = ((len(self.ticks) - TRAJECTORY_HEADER.size) //
+                         self.tick.size)
+        with open(filename + '.tiles', 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self.tileBuffer = mmap.mmap(f.fileno(), 0,
+                                            access=mmap.ACCESS_READ)
+            else:
+                self.tileBuffer = b''
+        self.tiles = memoryview(self.tileBuffer).cast('i')
+
+    def getNumTicks(self):
+        """
+        Return the number of time-steps recorded, counting time-step 0.
+
+        returns: an integer
+        """
+        return self.numTicks
+
+    def getTick(self, tick):
+        """
+        Return the record of time-step TICK: the number of tiles cleaned by
+        then, then the x, y and direction of each robot.
+
+        tick: an integer (0 <= tick < getNumTicks())
+        returns: a tuple
+        """
+        assert 0 <= tick < self.numTicks
+        # Line bellow broken to comply with pep8
+        return self.tick.unpack_from(self.ticks, TRAJECTORY_HEADER.size +
+                                     tick * self.tick.size)
+
+    def getNumCleanedTiles(self, tick):
+        """
+        Return the number of tiles cleaned by time-step TICK.
+
+        returns: an integer
+        """
+        return self.getTick(tick)[0]
+
+    def getCleanedTiles(self, tick):
+        """
+        Return the indices (y * width + x) of the tiles cleaned by time-step
+        TICK, in the order they were cleaned.
+
+        returns: a memoryview of ints into the log
+        """
+        return self.tiles[:self.getNumCleanedTiles(tick)]
+
+    def getRobots(self, tick):
+        """
+        Return the robots as they were at time-step TICK.
+
+        returns: a list of RecordedRobots
+        """
+        values = self.getTick(tick)
+        return [RecordedRobot(Position(values[i], values[i + 1]),
+                              values[i + 2])
+                for i in range(1, len(values), 3)]
+
+    def getRoom(self, tick):
+        """
+        Return the room as it was at time-step TICK.
+
+        returns: a RectangularRoom
+        """
+        room = RectangularRoom(self.width, self.height)
+        for tile in self.getCleanedTiles(tick):
+            room.tiles[tile] = 1
+        room.numCleanedTiles = self.getNumCleanedTiles(tick)
+        return room
+
+    def play(self, anim, start=0, stop=None, step=1):
+        """
+        Shows time-steps START, START + STEP, ... up to (but not including)
+        STOP in ANIM, e.g. a ps2_visualize.RobotVisualization, by calling
+        anim.update(room, robots) for each. The room is only built once and
+        then brought up to each time-step with the tiles cleaned since.
+
+        anim: anything with an update(room, robots) method
+        start, stop, step: integers, as for range; STOP defaults to
+                           getNumTicks()
+        """
+        if stop is None:
+            stop = self.numTicks
+        room = self.getRoom(start)
+        for tick in range(start, stop, step):
+            cleaned = self.getNumCleanedTiles(tick)
+            for tile in self.tiles[room.numCleanedTiles:cleaned]:
+                room.tiles[tile] = 1
+                if room.cleanLog is not None:
+                    room.cleanLog.append(tile)
+            room.numCleanedTiles = cleaned
+            anim.update(room, self.getRobots(tick))
+
+
+def runTrial(num_robots, speed, width, height, min_coverage, robot_type,
+             rng=None, fast_path=False, event_driven=False, record=None,
+             room_type=RectangularRoom, stats=None):
+    """
+    Runs a single trial of the simulation and returns the number of
+    time-steps needed to clean the fraction MIN_COVERAGE of the room.
+
+    rng: a random.Random or RandomSupply for the trial to draw from, or
+         None for the random module
+    fast_path: whether to step the robots with Robot.enableFastPath
+    event_driven: whether to jump from wall hit to wall hit with
+                  runTrialEventDriven (StandardRobot only)
+    record: a filename to log every time-step of the trial to with a
+            TrajectoryRecorder (not with EVENT_DRIVEN), or None
+    room_type: class of room to be instantiated with WIDTH, HEIGHT and RNG
+               (e.g. RectangularRoom or BitsetRoom; RectangularRoom only
+               with EVENT_DRIVEN)
+    stats: a SimulationStats to add the trial's counters and timings to (not
+           with EVENT_DRIVEN), or None
+
+    See runSimulation for the other arguments.
+    """
+    assert not (event_driven and record is not None)
+    assert not (event_driven and room_type is not RectangularRoom)
+    assert not (event_driven and stats is not None)
+    if event_driven:
+        return runTrialEventDriven(num_robots, speed, width, height,
+                                   min_coverage, robot_type, rng)
+    # ## Optional visualization
+    # anim = ps2_visualize.RobotVisualization(num_robots, width, height)
+    # ## End of optional visualization
+    numberOfTimeSteps = 0
+    if stats is not None:
+        trialStats = SimulationStats()
+        started = time.perf_counter()
+    room = room_type(width, height, rng)
+    currentCoverage = 0
+    robot = []
+    for i in range(num_robots):
+        robot.append(robot_type(room, speed))
+        if fast_path:
+            robot[-1].enableFastPath()
+        if stats is not None:
+            robot[-1].enableStats(trialStats)
+    recorder = None
+    if record is not None:
+        recorder = TrajectoryRecorder(record, room, robot)
+    if stats is not None:
+        # The same loop as below, timing each phase
+        stepped = time.perf_counter()
+        trialStats.setup = stepped - started
+        while currentCoverage < min_coverage:
+            started = time.perf_counter()
+            for i in robot:
+                i.updatePositionAndClean()
+            stepped = time.perf_counter()
+            currentCoverage = room.getNumCleanedTiles() / room.getNumTiles()
+            trialStats.coverage += time.perf_counter() - stepped
+            trialStats.stepping += stepped - started
+            numberOfTimeSteps += 1
+            if recorder is not None:
+                recorder.record()
+        stats.addTrial(trialStats, numberOfTimeSteps)
+    while currentCoverage < min_coverage:
+        # ## Optional visualization
+        # anim.update(room, robot)
+        # ## End of optional visualization
+        for i in robot:
+            i.updatePositionAndClean()
+        currentCoverage = room.getNumCleanedTiles() / room.getNumTiles()
+        numberOfTimeSteps += 1
+        if recorder is not None:
+            recorder.record()
+    if recorder is not None:
+        recorder.close()
+    # ## Optional visualization
+    # anim.done()
+    # ## End of optional visualization
+    return numberOfTimeSteps
+
+
+def runTrialEventDriven(num_robots, speed, width, height, min_coverage,
+                        robot_type=StandardRobot, rng=None,
+                        max_stretch=4096):
+    """
+    Runs a single trial of the simulation with StandardRobots and returns the
+    number of time-steps needed to clean the fraction MIN_COVERAGE of the
+    room, the same number runTrial returns for the same random stream.
+
+    Instead of stepping every robot each time-step, the trial jumps from one
+    wall hit to the next. A StandardRobot goes in a straight line until it
+    would leave the room, so the time-steps it has left before that are
+    worked out in closed form from its position and direction, and the tiles
+    it lands on along the way are listed in one go. All robots then clean
+    their tiles up to the first wall hit, and the robots at a wall pick new
+    directions (in robot order, as with runTrial). Only a stretch in which
+    MIN_COVERAGE could be reached is checked time-step by time-step, so the
+    count stops exactly where runTrial's would.
+
+    robot_type: StandardRobot (or a subclass that moves like it)
+    rng: a random.Random or RandomSupply for the trial to draw from, or
+         None for the random module
+    max_stretch: most time-steps of tiles to list at once for a robot (bounds
+                 memory for long straight lines)
+
+    See runSimulation for the other arguments.
+    """
+    room = RectangularRoom(width, height, rng)
+    robots = [robot_type(room, speed) for i in range(num_robots)]
+    if not 0 < min_coverage:
+        return 0
+    numTiles = room.getNumTiles()
+    # Fewest cleaned tiles that stop runTrial's loop
+    needed = max(0, math.ceil(min_coverage * numTiles) - 1)
+    while needed / numTiles < min_coverage:
+        needed += 1
+    deltas = getDeltaTable(speed)
+    tiles = room.tiles
+    # For each robot: its direction, the tiles it lands on next, how many of
+    # those it has landed on already, where it is after the last of them and
+    # whether its next move after them would leave the room
+    direction = [robot.getRobotDirection() for robot in robots]
+    path = [[] for robot in robots]
+    done = [0] * num_robots
+    end = [[robot.getRobotPosition().getX(), robot.getRobotPosition().getY()]
+           for robot in robots]
+    atWall = [False] * num_robots
+
+    def extendPath(r):
+        delta_x, delta_y = deltas[direction[r]]
+        px, py = end[r]
+        # Time-steps until the next wall in closed form. The positions are
+        # still added up one at a time, as getNewPosition does, so they are
+        # the same to the last bit, but only the last couple before the wall
+        # are checked against it
+        limits = [max_stretch]
+        if delta_x > 0:
+            limits.append((width - px) / delta_x)
+        elif delta_x < 0:
+            limits.append(px / -delta_x)
+        if delta_y > 0:
+            limits.append((height - py) / delta_y)
+        elif delta_y < 0:
+            limits.append(py / -delta_y)
+        robotPath = []
+        for t in range(max(0, int(min(limits)) - 2)):
+            px += delta_x
+            py += delta_y
+            robotPath.append(math.floor(py) * width + math.floor(px))
+        atWall[r] = False
+        while len(robotPath) < max_stretch:
+            new_x, new_y = px + delta_x, py + delta_y
+            if new_x < 0 or new_y < 0 or new_x >= width or new_y >= height:
+                atWall[r] = True
+                break
+            px, py = new_x, new_y
+            robotPath.append(math.floor(py) * width + math.floor(px))
+        path[r] = robotPath
+        done[r] = 0
+        end[r] = [px, py]
+
+    for r in range(num_robots):
+        extendPath(r)
+    numberOfTimeSteps = 0
+    while True:
+        # Time-steps until the first robot hits a wall (that time-step
+        # included) or runs out of listed tiles
+        ticks = min(len(path[r]) - done[r] + atWall[r]
+                    for r in range(num_robots))
+        moves = sum(min(len(path[r]) - done[r], ticks)
+                    for r in range(num_robots))
+        # Line bellow broken to comply with pep8
+        bouncing = [r for r in range(num_robots)
+                    if atWall[r] and len(path[r]) - done[r] + 1 == ticks]
+        if room.numCleanedTiles + moves < needed:
+            for r in range(num_robots):
+                for tile in path[r][done[r]:done[r] + ticks]:
+                    if not tiles[tile]:
+                        tiles[tile] = 1
+                        room.numCleanedTiles += 1
+        else:
+            for t in range(ticks):
+                for r in range(num_robots):
+                    if done[r] + t < len(path[r]):
+                        tile = path[r][done[r] + t]
+                        if not tiles[tile]:
+                            tiles[tile] = 1
+                            room.numCleanedTiles += 1
+                if room.numCleanedTiles >= needed:
+                    # The robots bouncing on this last time-step still draw
+                    # their new directions, as they do with runTrial
+                    if t == ticks - 1:
+                        for r in bouncing:
+                            room.rng.randrange(0, 360)
+                    return numberOfTimeSteps + t + 1
+        numberOfTimeSteps += ticks
+        for r in bouncing:
+            direction[r] = room.rng.randrange(0, 360)
+        for r in range(num_robots):
+            done[r] = min(len(path[r]), done[r] + ticks)
+            if r in bouncing or done[r] == len(path[r]):
+                extendPath(r)
+
+
+def runSeededTrial(num_robots, speed, width, height, min_coverage,
+                   robot_type, seed, trial, fast_path=False,
+                   event_driven=False, record=None,
+                   room_type=RectangularRoom, stats=None):
+    """
+    Runs trial number TRIAL of a simulation seeded with SEED, drawing from a
+    random stream of its own derived from both, so it cleans the same way
+    whichever process runs it. If RECORD is given, the trial is logged to
+    RECORD % TRIAL.
+    """
+    # A trial makes too few draws for a RandomSupply's blocks to pay off
+    rng = random.Random('%d:%d' % (seed, trial))
+    if record is not None:
+        record = record % trial
+    return runTrial(num_robots, speed, width, height, min_coverage,
+                    robot_type, rng, fast_path, event_driven, record,
+                    room_type, stats)
+
+
+def runProfiledSeededTrial(num_robots, speed, width, height, min_coverage,
+                           robot_type, seed, trial, fast_path=False,
+                           event_driven=False, record=None,
+                           room_type=RectangularRoom):
+    """
+    Like runSeededTrial, but returns a SimulationStats of the trial along
+    with its number of time-steps, so that stats can be sent back from
+    another process.
+    """
+    stats = SimulationStats()
+    timeSteps = runSeededTrial(num_robots, speed, width, height,
+                               min_coverage, robot_type, seed, trial,
+                               fast_path, event_driven, record, room_type,
+                               stats)
+    return timeSteps, stats
+
+
 def runSimulation(num_robots, speed, width, height, min_coverage, num_trials,
-                  robot_type):
+                  robot_type, workers=None, seed=None, fast_path=False,
+                  event_driven=False, record=None,
+                  room_type=RectangularRoom, stats=None):
     """
     Runs NUM_TRIALS trials of the simulation and returns the mean number of
     time-steps needed to clean the fraction MIN_COVERAGE of the room.
@@ -280,6 +1121,12 @@ def runSimulation(num_robots, speed, width, height, min_coverage, num_trials,
     The simulation is run with NUM_ROBOTS robots of type ROBOT_TYPE, each with
     speed SPEED, in a room of dimensions WIDTH x HEIGHT.
 
+    By default every trial draws from the global random module, one after the
+    other. If WORKERS or SEED is given, each trial instead gets its own
+    random stream derived from SEED and the trial number, and the trials are
+    spread over WORKERS processes; the result is then the same whatever the
+    number of workers. Without a SEED, one is drawn from the random module.
+
     num_robots: an int (num_robots > 0)
     speed: a float (speed > 0)
     width: an int (width > 0)
@@ -288,6 +1135,24 @@ def runSimulation(num_robots, speed, width, height, min_coverage, num_trials,
     num_trials: an int (num_trials > 0)
     robot_type: class of robot to be instantiated (e.g. StandardRobot or
                 RandomWalkRobot)
+    workers: number of processes to run the trials in (an int), or None
+    seed: an int to derive the random stream of each trial from, or None
+    fast_path: whether to step the robots without allocating (see
+               Robot.enableFastPath); the result is the same either way
+    event_driven: whether to jump from wall hit to wall hit instead of
+                  stepping (see runTrialEventDriven; StandardRobot only); the
+                  result is the same either way
+    record: a filename with a %d for the trial number (e.g. 'trial%d.log')
+            to log every time-step of each trial to (see TrajectoryRecorder
+            and TrajectoryReplay), or None; not with EVENT_DRIVEN
+    room_type: class of room to be instantiated with WIDTH, HEIGHT and a
+               random stream (e.g. RectangularRoom, or BitsetRoom for very
+               large rooms; functools.partial(BitsetRoom, obstacles=mask)
+               for a room with obstacles); RectangularRoom only with
+               EVENT_DRIVEN
+    stats: a SimulationStats to add the counters and timings of every trial
+           to, in trial order (not with EVENT_DRIVEN), or None; the result
+           is the same either way
 
     returns: Cleaning time in timesteps
     """
@@ -299,32 +1164,486 @@ def runSimulation(num_robots, speed, width, height, min_coverage, num_trials,
     assert (min_coverage >= 0 and min_coverage <=
             1.0 and type(min_coverage) == float)
     assert num_trials > 0 and type(num_trials) == int
-    listOfNumberOfTimeSteps = []
-    for i in range(num_trials):
-        # ## Optional visualization
-        # anim = ps2_visualize.RobotVisualization(num_robots, width, height)
-        # ## End of optional visualization
-        numberOfTimeSteps = 0
-        room = RectangularRoom(width, height)
-        currentCoverage = 0
-        robot = []
-        for i in range(num_robots):
-            robot.append(robot_type(room, speed))
-        while currentCoverage < min_coverage:
-            # ## Optional visualization
-            # anim.update(room, robot)
-            # ## End of optional visualization
-            for i in robot:
-                i.updatePositionAndClean()
-            currentCoverage = room.getNumCleanedTiles() / room.getNumTiles()
-            numberOfTimeSteps += 1
-        listOfNumberOfTimeSteps.append(numberOfTimeSteps)
-        # ## Optional visualization
-        # anim.done()
-        # ## End of optional visualization
+    assert workers is None or (workers > 0 and type(workers) == int)
+    if workers is None and seed is None:
+        listOfNumberOfTimeSteps = [
+            runTrial(num_robots, speed, width, height, min_coverage,
+                     robot_type, None, fast_path, event_driven,
+                     None if record is None else record % i, room_type,
+                     stats)
+            for i in range(num_trials)]
+        return float(sum(listOfNumberOfTimeSteps) / num_trials)
+    if seed is None:
+        seed = random.getrandbits(64)
+    # One list per argument of runSeededTrial, one entry per trial
+    arguments = [[num_robots] * num_trials, [speed] * num_trials,
+                 [width] * num_trials, [height] * num_trials,
+                 [min_coverage] * num_trials, [robot_type] * num_trials,
+                 [seed] * num_trials, range(num_trials),
+                 [fast_path] * num_trials, [event_driven] * num_trials,
+                 [record] * num_trials, [room_type] * num_trials]
+    trialRunner = runSeededTrial if stats is None else runProfiledSeededTrial
+    if workers is None or workers == 1:
+        listOfNumberOfTimeSteps = list(map(trialRunner, *arguments))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            listOfNumberOfTimeSteps = list(pool.map(
+                trialRunner, *arguments,
+                chunksize=max(1, num_trials // (4 * workers))))
+    if stats is not None:
+        for timeSteps, trialStats in listOfNumberOfTimeSteps:
+            stats.merge(trialStats)
+        listOfNumberOfTimeSteps = [
+            timeSteps for timeSteps, trialStats in listOfNumberOfTimeSteps]
     return float(sum(listOfNumberOfTimeSteps) / num_trials)
 
 
+# The result of runSimulationAdaptive: the mean cleaning time, its standard
+# error, the (low, high) confidence interval around the mean and the number
+# of trials run.
+SimulationEstimate = namedtuple('SimulationEstimate',
+                                ['mean', 'stderr', 'interval', 'num_trials'])
+
+
+def runSimulationAdaptive(num_robots, speed, width, height, min_coverage,
+                          robot_type, rel_width=0.05, confidence=0.95,
+                          time_budget=None, min_trials=10, max_trials=None,
+                          batch_size=None, workers=None, seed=None,
+                          fast_path=False, event_driven=False):
+    """
+    Like runSimulation, but instead of running a fixed number of trials keeps
+    running them in batches of BATCH_SIZE until the confidence interval
+    around the mean cleaning time is at most REL_WIDTH of the mean on either
+    side, TIME_BUDGET seconds have passed, or MAX_TRIALS trials have been
+    run, whichever comes first.
+
+    The interval is the normal one, mean +/- z * stderr, so at least
+    MIN_TRIALS trials are always run for the standard error to be
+    meaningful. Each trial draws from its own random stream derived from
+    SEED and the trial number, as in runSimulation, so the trials run are the
+    first ones runSimulation(..., seed=SEED) would run.
+
+    rel_width: largest half-width of the interval relative to the mean (a
+               float > 0)
+    confidence: confidence level of the interval (0 < confidence < 1)
+    time_budget: seconds to stop after (a float), or None for no limit
+    min_trials: fewest trials to run (an int >= 2)
+    max_trials: most trials to run (an int), or None for no limit
+    batch_size: trials to run between checks (an int), or None for one
+                batch of MIN_TRIALS and then 4 trials per worker
+
+    See runSimulation for the other arguments.
+
+    returns: a SimulationEstimate
+    """
+    assert num_robots > 0 and type(num_robots) == int
+    assert speed > 0 and type(speed) == float
+    assert width > 0 and type(width) == int
+    assert height > 0 and type(height) == int
+    # Line bellow broken to comply with pep8
+    assert (min_coverage >= 0 and min_coverage <=
+            1.0 and type(min_coverage) == float)
+    assert rel_width > 0 and 0 < confidence < 1
+    assert min_trials >= 2 and type(min_trials) == int
+    assert max_trials is None or max_trials >= min_trials
+    assert batch_size is None or (batch_size > 0 and type(batch_size) == int)
+    assert workers is None or (workers > 0 and type(workers) == int)
+    if seed is None:
+        seed = random.getrandbits(64)
+    if batch_size is None:
+        batch_size = 4 * (workers or 1)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    deadline = None if time_budget is None else time.time() + time_budget
+    pool = None
+    if workers is not None and workers > 1:
+        pool = ProcessPoolExecutor(workers)
+    try:
+        trials = 0
+        total = 0
+        totalSquares = 0
+        size = min_trials
+        while True:
+            if max_trials is not None:
+                size = min(size, max_trials - trials)
+            arguments = [[num_robots] * size, [speed] * size, [width] * size,
+                         [height] * size, [min_coverage] * size,
+                         [robot_type] * size, [seed] * size,
+                         range(trials, trials + size), [fast_path] * size,
+                         [event_driven] * size]
+            if pool is None:
+                batch = list(map(runSeededTrial, *arguments))
+            else:
+                batch = list(pool.map(
+                    runSeededTrial, *arguments,
+                    chunksize=max(1, size // (4 * workers))))
+            trials += size
+            # Cleaning times are ints, so these sums are exact
+            total += sum(batch)
+            totalSquares += sum(steps * steps for steps in batch)
+            mean = total / trials
+            variance = max(0, totalSquares - total * total / trials)
+            stderr = math.sqrt(variance / (trials - 1) / trials)
+            if (z * stderr <= rel_width * mean or
+                    trials == max_trials or
+                    (deadline is not None and time.time() >= deadline)):
+                break
+            size = batch_size
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return SimulationEstimate(mean, stderr,
+                              (mean - z * stderr, mean + z * stderr), trials)
+
+
+def runCoverageTrial(num_robots, speed, width, height, coverage_levels,
+                     robot_type, rng=None, max_points=4096):
+    """
+    Runs a single trial of the simulation until the highest of
+    COVERAGE_LEVELS is reached, recording along the way the time-step at
+    which each level was first reached and the coverage after every
+    time-step.
+
+    To keep memory bounded, at most MAX_POINTS coverages are kept: whenever
+    that many have been recorded, every other one is dropped and from then
+    on only every other time-step is recorded, so the curve holds the
+    coverage after every STRIDE-th time-step. The coverage after the last
+    time-step is returned on its own, as it is usually not on the curve.
+
+    coverage_levels: a list of floats (0 <= level <= 1.0)
+    rng: a random.Random or RandomSupply for the trial to draw from, or
+         None for the random module
+    max_points: most coverages to keep (an even int >= 2)
+
+    See runSimulation for the other arguments.
+
+    returns: a tuple of the list of time-steps at which each level in
+    COVERAGE_LEVELS was reached (the same each runTrial would return for the
+    same random stream), an array('f') of the coverage after time-steps
+    STRIDE, 2 * STRIDE, ... up to the last time-step, STRIDE (an int) and
+    the coverage after the last time-step (the highest of the time-steps
+    returned, or 0 if no time-step was taken)
+    """
+    room = RectangularRoom(width, height, rng)
+    robot = [robot_type(room, speed) for i in range(num_robots)]
+    levels = sorted(range(len(coverage_levels)),
+                    key=lambda i: coverage_levels[i])
+    times = [0] * len(coverage_levels)
+    # Like runTrial, every level but 0 takes at least one time-step
+    reached = 0
+    while (reached < len(levels) and
+           not 0 < coverage_levels[levels[reached]]):
+        reached += 1
+    curve = array.array('f')
+    stride = 1
+    numberOfTimeSteps = 0
+    numTiles = room.getNumTiles()
+    while reached < len(levels):
+        for i in robot:
+            i.updatePositionAndClean()
+        numberOfTimeSteps += 1
+        currentCoverage = room.getNumCleanedTiles() / numTiles
+        while (reached < len(levels) and
+               currentCoverage >= coverage_levels[levels[reached]]):
+            times[levels[reached]] = numberOfTimeSteps
+            reached += 1
+        if numberOfTimeSteps % stride == 0:
+            curve.append(currentCoverage)
+            if len(curve) == max_points:
+                curve = curve[1::2]
+                stride *= 2
+    return times, curve, stride, room.getNumCleanedTiles() / numTiles
+
+
+def runSeededCoverageTrial(num_robots, speed, width, height,
+                           coverage_levels, robot_type, max_points, seed,
+                           trial):
+    """
+    Runs trial number TRIAL of runCoverageCurves seeded with SEED, drawing
+    from the same random stream as runSeededTrial.
+    """
+    rng = random.Random('%d:%d' % (seed, trial))
+    return runCoverageTrial(num_robots, speed, width, height,
+                            coverage_levels, robot_type, rng, max_points)
+
+
+def runCoverageCurves(num_robots, speed, width, height, coverage_levels,
+                      num_trials, robot_type, max_points=4096, workers=None,
+                      seed=None):
+    """
+    Runs NUM_TRIALS trials of the simulation, each only once, and returns
+    the time-step at which each of COVERAGE_LEVELS was first reached in each
+    trial, along with the coverage over time of every trial.
+
+    Each trial draws from its own random stream, derived from SEED and the
+    trial number as in runSimulation, so for a given SEED the time-steps for
+    a level are the ones runSimulation(..., seed=SEED) averages for that
+    level as MIN_COVERAGE. Trials are spread over WORKERS processes if given.
+
+    coverage_levels: a list of floats (0 <= level <= 1.0)
+    max_points: most coverages to keep per trial (see runCoverageTrial)
+    workers: number of processes to run the trials in (an int), or None
+    seed: an int to derive the random stream of each trial from, or None to
+          draw one from the random module
+
+    See runSimulation for the other arguments.
+
+    returns: a tuple of
+    - a (num_trials, len(coverage_levels)) int32 array of time-steps, whose
+      mean over trials is what runSimulation returns for each level;
+    - a (num_trials, points) float32 array of the coverage of each trial
+      after every STRIDE-th time-step, with each trial held at its coverage
+      after its last time-step from the first column at or past that
+      time-step on (so every row ends at the trial's final coverage);
+    - STRIDE (an int).
+    """
+    assert num_trials > 0 and type(num_trials) == int
+    assert all(0 <= level <= 1.0 for level in coverage_levels)
+    if seed is None:
+        seed = random.getrandbits(64)
+    # One list per argument of runSeededCoverageTrial, one entry per trial
+    arguments = [[num_robots] * num_trials, [speed] * num_trials,
+                 [width] * num_trials, [height] * num_trials,
+                 [coverage_levels] * num_trials, [robot_type] * num_trials,
+                 [max_points] * num_trials, [seed] * num_trials,
+                 range(num_trials)]
+    if workers is None or workers == 1:
+        results = list(map(runSeededCoverageTrial, *arguments))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(
+                runSeededCoverageTrial, *arguments,
+                chunksize=max(1, num_trials // (4 * workers))))
+    times = np.array([result[0] for result in results], dtype=np.int32)
+    times = times.reshape(num_trials, len(coverage_levels))
+    # Bring every curve to the coarsest stride, then to the same length,
+    # counting the column at or past a trial's last time-step
+    stride = max(result[2] for result in results)
+    curves = []
+    points = 0
+    for trialTimes, curve, trialStride, final in results:
+        curve = np.frombuffer(curve, dtype=np.float32)
+        curves.append(curve[stride // trialStride - 1::stride // trialStride])
+        points = max(points, -(-max(trialTimes, default=0) // stride))
+    coverage = np.empty((num_trials, points), dtype=np.float32)
+    for trial, curve in enumerate(curves):
+        coverage[trial, :len(curve)] = curve
+        coverage[trial, len(curve):] = results[trial][3]
+    return times, coverage, stride
+
+
+# Version of the simulation whose results runSweep caches: bump it whenever a
+# change makes trials with the same seed clean differently, so cells cached
+# before are run again
+SIMULATION_VERSION = 3
+
+
+def sweepCellKey(num_robots, speed, width, height, min_coverage, robot_type,
+                 num_trials, seed):
+    """
+    Returns the key of a cell of runSweep in its cache: a string naming the
+    simulation version and every parameter the cell's result depends on.
+    """
+    return json.dumps([SIMULATION_VERSION, num_robots, speed, width, height,
+                       min_coverage, robot_type.__name__, num_trials, seed])
+
+
+def runSweep(num_robots, speeds, room_sizes, min_coverages, robot_types,
+             num_trials, seed=0, workers=None,
+             cache_file='ps2_sweep_cache.json'):
+    """
+    Runs NUM_TRIALS trials of the simulation for every combination of the
+    given parameters (a cell) and returns the statistics of each cell.
+
+    Each cell's trials draw from the same random streams as runSimulation
+    (..., seed=SEED), so its mean is what that returns. The statistics of
+    every cell are kept in CACHE_FILE, keyed by the cell's parameters, the
+    number of trials, SEED and SIMULATION_VERSION, and only the cells not
+    found there are run, their trials spread over WORKERS processes.
+
+    num_robots: a list of ints (num_robots > 0)
+    speeds: a list of floats (speed > 0)
+    room_sizes: a list of (width, height) pairs of ints
+    min_coverages: a list of floats (0 <= min_coverage <= 1.0)
+    robot_types: a list of robot classes (e.g. StandardRobot)
+    num_trials: an int (num_trials > 0)
+    seed: an int to derive the random stream of each trial from
+    workers: number of processes to run the trials in (an int), or None
+    cache_file: JSON file to keep cell statistics in, or None to not keep
+                them
+
+    returns: a list with a dictionary for each cell, in the order of the
+    parameter lists (robot counts varying slowest), with the cell's
+    parameters (robot_type by name), num_trials, seed and the 'mean',
+    'stderr', 'min' and 'max' cleaning times
+    """
+    assert num_trials > 0 and type(num_trials) == int
+    assert workers is None or (workers > 0 and type(workers) == int)
+    cells = [(robots, speed, width, height, coverage, robot_type)
+             for robots in num_robots for speed in speeds
+             for width, height in room_sizes for coverage in min_coverages
+             for robot_type in robot_types]
+    for robots, speed, width, height, coverage, robot_type in cells:
+        assert robots > 0 and type(robots) == int
+        assert speed > 0 and type(speed) == float
+        assert width > 0 and type(width) == int
+        assert height > 0 and type(height) == int
+        assert 0 <= coverage <= 1.0 and type(coverage) == float
+    cache = {}
+    if cache_file is not None and os.path.exists(cache_file):
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+    keys = [sweepCellKey(*(cell + (num_trials, seed))) for cell in cells]
+    missing = [i for i in range(len(cells)) if keys[i] not in cache]
+    # One list per argument of runSeededTrial, one entry per trial of every
+    # missing cell
+    arguments = [[] for i in range(9)]
+    for i in missing:
+        robots, speed, width, height, coverage, robot_type = cells[i]
+        for values, value in zip(arguments, (robots, speed, width, height,
+                                             coverage, robot_type, seed)):
+            values.extend([value] * num_trials)
+        arguments[7].extend(range(num_trials))
+        # Every trial steps without allocating, which cleans the same way
+        arguments[8].extend([True] * num_trials)
+    pool = None
+    try:
+        if workers is None or workers == 1:
+            results = map(runSeededTrial, *arguments)
+        else:
+            pool = ProcessPoolExecutor(workers)
+            results = pool.map(runSeededTrial, *arguments,
+                               chunksize=max(1, len(arguments[0]) //
+                                             (4 * workers)))
+        # Results come in trial order, a cell at a time, and each finished
+        # cell is cached straight away so an interrupted sweep keeps it
+        for i in missing:
+            times = [next(results) for trial in range(num_trials)]
+            mean = sum(times) / num_trials
+            variance = 0.0
+            if num_trials > 1:
+                # Line bellow broken to comply with pep8
+                variance = (sum((steps - mean) ** 2 for steps in times) /
+                            (num_trials - 1))
+            cache[keys[i]] = {'mean': mean,
+                              'stderr': math.sqrt(variance / num_trials),
+                              'min': min(times), 'max': max(times)}
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if cache_file is not None and missing != []:
+            temporaryName = cache_file + '.%d' % os.getpid()
+            with open(temporaryName, 'w') as f:
+                json.dump(cache, f, indent=1)
+            os.replace(temporaryName, cache_file)
+    table = []
+    for cell, key in zip(cells, keys):
+        robots, speed, width, height, coverage, robot_type = cell
+        row = {'num_robots': robots, 'speed': speed, 'width': width,
+               'height': height, 'min_coverage': coverage,
+               'robot_type': robot_type.__name__, 'num_trials': num_trials,
+               'seed': seed}
+        row.update(cache[key])
+        table.append(row)
+    return table
+
+
+def runSimulationVectorized(num_robots, speed, width, height, min_coverage,
+                            num_trials, robot_type, seed=None):
+    """
+    Runs the same simulation as runSimulation, but with every trial at once:
+    the robots of all trials are kept in NumPy arrays of x, y and direction,
+    and each time-step moves, bounces and cleans for all of them together.
+    Trials stop being stepped once they reach MIN_COVERAGE.
+
+    Robots follow the rules of ROBOT_TYPE (StandardRobot or RandomWalkRobot,
+    or a subclass of either), but random numbers come from a NumPy generator
+    and robots in a trial move at the same time rather than one after the
+    other. The mean cleaning time has the same distribution as with
+    runSimulation, but not the same value for a given seed.
+
+    The room of every trial is kept in memory at once (num_trials * width *
+    height bytes).
+
+    num_robots: an int (num_robots > 0)
+    speed: a float (speed > 0)
+    width: an int (width > 0)
+    height: an int (height > 0)
+    min_coverage: a float (0 <= min_coverage <= 1.0)
+    num_trials: an int (num_trials > 0)
+    robot_type: StandardRobot or RandomWalkRobot (or a subclass of either)
+    seed: seed for the NumPy random generator, or None for a random one
+
+    returns: Cleaning time in timesteps
+    """
+    assert num_robots > 0 and type(num_robots) == int
+    assert speed > 0 and type(speed) == float
+    assert width > 0 and type(width) == int
+    assert height > 0 and type(height) == int
+    # Line bellow broken to comply with pep8
+    assert (min_coverage >= 0 and min_coverage <=
+            1.0 and type(min_coverage) == float)
+    assert num_trials > 0 and type(num_trials) == int
+    if issubclass(robot_type, RandomWalkRobot):
+        randomWalk = True
+    elif issubclass(robot_type, StandardRobot):
+        randomWalk = False
+    else:
+        raise ValueError('Unsupported robot type: %r' % (robot_type,))
+    rng = RandomSupply(seed).generator
+    # Change in position for each whole-degree direction, as getNewPosition
+    angles = np.radians(np.arange(360, dtype=float))
+    deltaX = speed * np.sin(angles)
+    deltaY = speed * np.cos(angles)
+    numTiles = width * height
+    shape = (num_trials, num_robots)
+    x = rng.integers(0, width, shape).astype(float)
+    y = rng.integers(0, height, shape).astype(float)
+    direction = rng.integers(0, 360, shape)
+    # Cleaned tiles of every trial, trial after trial
+    cleaned = np.zeros(num_trials * numTiles, dtype=bool)
+    trials = np.arange(num_trials)
+    tiles = (trials[:, None] * numTiles + y.astype(int) * width +
+             x.astype(int))
+    cleaned[tiles.ravel()] = True
+    numCleaned = cleaned.reshape(num_trials, numTiles).sum(axis=1)
+    timeSteps = np.zeros(num_trials, dtype=int)
+    # Like runSimulation, every trial takes at least one step unless no
+    # coverage is needed at all. Only the trials still running are kept in
+    # x, y, direction and numCleaned; trials holds their numbers.
+    step = 0
+    while min_coverage > 0 and trials.size:
+        step += 1
+        if randomWalk:
+            # A new direction other than the current one
+            direction = (direction +
+                         rng.integers(1, 360, direction.shape)) % 360
+        newX = x + deltaX[direction]
+        newY = y + deltaY[direction]
+        inRoom = (newX >= 0) & (newY >= 0) & (newX < width) & (newY < height)
+        if not randomWalk:
+            direction = np.where(inRoom, direction,
+                                 rng.integers(0, 360, direction.shape))
+        x = np.where(inRoom, newX, x)
+        y = np.where(inRoom, newY, y)
+        # Robots that did not move are on a tile that is already clean
+        tiles = (trials[:, None] * numTiles + np.floor(y).astype(int) * width +
+                 np.floor(x).astype(int)).ravel()
+        newlyCleaned = tiles[~cleaned[tiles]]
+        if newlyCleaned.size:
+            newlyCleaned = np.unique(newlyCleaned)
+            cleaned[newlyCleaned] = True
+            numCleaned += np.bincount(
+                np.searchsorted(trials, newlyCleaned // numTiles),
+                minlength=trials.size)
+        running = numCleaned / numTiles < min_coverage
+        if not running.all():
+            timeSteps[trials[~running]] = step
+            trials = trials[running]
+            x, y, direction = x[running], y[running], direction[running]
+            numCleaned = numCleaned[running]
+    return float(timeSteps.sum() / num_trials)
+
+
 # ##Uncomment these lines bellow to see a simulation of how many time steps
 # ##each implementation takes on average
 
@@ -3,10 +3,12 @@
 # Simulating the Spread of Disease and Virus Population Dynamics
 
 from ps3b_precompiled_36 import *
-import random
+from random_supply import RandomSupply
+import numpy
 import pylab
 
-random.seed(0)  # Comment this line to see different results!
+# Viruses draw from this supply of random numbers, pre-drawn in blocks
+randomSupply = RandomSupply(0)  # Seed with None to see different results!
 
 
 class NoChildException(Exception):
@@ -50,7 +52,7 @@ class SimpleVirus(object):
         returns: True with probability self.getClearProb and otherwise returns
         False.
         """
-        if random.random() <= self.getClearProb():
+        if randomSupply.random() <= self.getClearProb():
             return True
         else:
             return False
@@ -74,10 +76,20 @@ class SimpleVirus(object):
         maxBirthProb and clearProb values as this virus. Raises a
         NoChildException if this virus particle does not reproduce.
         """
-        if random.random() <= (self.maxBirthProb * (1 - popDensity)):
-            return SimpleVirus(self.maxBirthProb, self.clearProb)
-        else:
+        child = self.reproduceOrNone(popDensity)
+        if child is None:
             raise NoChildException('NoChildException')
+        return child
+
+    def reproduceOrNone(self, popDensity):
+        """
+        Like reproduce, but returns None if this virus particle does not
+        reproduce, for the update() loops to not raise an exception for
+        every particle that does not.
+        """
+        if randomSupply.random() <= (self.maxBirthProb * (1 - popDensity)):
+            return SimpleVirus(self.maxBirthProb, self.clearProb)
+        return None
 
 
 class Patient(object):
@@ -132,17 +144,16 @@ class Patient(object):
         returns: The total virus population at the end of the update (an
         integer)
         """
-        copyViruses = self.getViruses()[:]
-        for virus in copyViruses:
-            if virus.doesClear():
-                self.viruses.remove(virus)
+        # Keeps the survivors in order, in the same list
+        self.viruses[:] = [virus for virus in self.viruses
+                           if not virus.doesClear()]
         if self.getPopDensity() < 1:
-            copyViruses = self.getViruses()[:]
-            for virus in copyViruses:
-                try:
-                    self.viruses.append(virus.reproduce(self.getPopDensity()))
-                except NoChildException:
-                    pass
+            # Only the survivors reproduce, each seeing the density with the
+            # children born before it
+            for i in range(len(self.viruses)):
+                child = self.viruses[i].reproduceOrNone(self.getPopDensity())
+                if child is not None:
+                    self.viruses.append(child)
         return self.getTotalPop()
 
 
@@ -263,19 +274,28 @@ class ResistantVirus(SimpleVirus):
         maxBirthProb and clearProb values as this virus. Raises a
         NoChildException if this virus particle does not reproduce.
         """
+        child = self.reproduceOrNone(popDensity, activeDrugs)
+        if child is None:
+            raise NoChildException('NoChildException')
+        return child
+
+    def reproduceOrNone(self, popDensity, activeDrugs):
+        """
+        Like reproduce, but returns None if this virus particle does not
+        reproduce.
+        """
         for drug in activeDrugs:
             if not self.isResistantTo(drug):
-                raise NoChildException('NoChildException')
+                return None
         inheritance = dict(self.getResistances())
         for trait in inheritance:
-            if random.random() <= self.getMutProb():
+            if randomSupply.random() <= self.getMutProb():
                 inheritance[trait] = not self.getResistances()[trait]
-        if random.random() <= (self.maxBirthProb * (1 - popDensity)):
+        if randomSupply.random() <= (self.maxBirthProb * (1 - popDensity)):
             # Line bellow broken to comply with pep8
             return ResistantVirus(self.maxBirthProb, self.clearProb,
                                   inheritance, self.getMutProb())
-        else:
-            raise NoChildException('NoChildException')
+        return None
 
 
 class TreatedPatient(Patient):
@@ -353,22 +373,350 @@ class TreatedPatient(Patient):
         returns: The total virus population at the end of the update (an
         integer)
         """
-        copyViruses = self.getViruses()[:]
-        for virus in copyViruses:
-            if virus.doesClear():
-                self.viruses.remove(virus)
+        # Keeps the survivors in order, in the same list
+        self.viruses[:] = [virus for virus in self.viruses
+                           if not virus.doesClear()]
+        if self.getPopDensity() < 1:
+            # Only the survivors reproduce, each seeing the density with the
+            # children born before it
+            for i in range(len(self.viruses)):
+                # Line bellow broken to comply with pep8
+                child = self.viruses[i].reproduceOrNone(
+                    self.getPopDensity(), self.getPrescriptions())
+                if child is not None:
+                    self.viruses.append(child)
+        return self.getTotalPop()
+
+
+class GenotypePatient(TreatedPatient):
+    """
+    Representation of a patient whose virus population is kept as a count of
+    particles per genotype instead of one object per particle, so a time
+    step takes time in proportion to the number of genotypes, whatever the
+    population.
+
+    A genotype is everything that sets how a particle behaves: its
+    maxBirthProb, clearProb and mutProb and its resistances. Each time step,
+    the particles of a genotype that are cleared, the survivors that
+    reproduce and the resistances their offspring get are drawn as binomial
+    and multinomial samples. This is the same model as TreatedPatient.update,
+    except that every particle reproduces with the population density of
+    the start of the reproduction phase (rather than one that grows with each
+    child added).
+    """
+
+    def __init__(self, viruses, maxPop):
+        """
+        Initialization function, counts the viruses by genotype and saves
+        the maxPop parameter as an attribute. Also initializes the list of
+        drugs being administered (which should initially include no drugs).
+
+        viruses: The list representing the virus population (a list of
+        SimpleVirus or ResistantVirus instances)
+
+        maxPop: The maximum virus population for this patient (an integer)
+        """
+        TreatedPatient.__init__(self, [], maxPop)
+        # Genotype: (maxBirthProb, clearProb, mutProb, resistances as a
+        # sorted tuple of (drug, resistant) pairs), mapped to its count
+        self.counts = {}
+        # Genotype: (genotypes its offspring can have, their probabilities)
+        self.offspring = {}
+        for virus in viruses:
+            self.addViruses(virus, 1)
+
+    def addViruses(self, virus, count):
+        """
+        Add COUNT particles of the genotype of VIRUS to the population.
+
+        virus: a SimpleVirus or ResistantVirus instance
+        count: an integer >= 0
+        """
+        if isinstance(virus, ResistantVirus):
+            genotype = (virus.getMaxBirthProb(), virus.getClearProb(),
+                        virus.getMutProb(),
+                        tuple(sorted(virus.getResistances().items())))
+        else:
+            genotype = (virus.getMaxBirthProb(), virus.getClearProb(), 0.0,
+                        ())
+        self.counts[genotype] = self.counts.get(genotype, 0) + count
+
+    def getGenotypeCounts(self):
+        """
+        Returns a dictionary of the number of particles of each genotype
+        (see __init__) in the population.
+        """
+        return {genotype: count for genotype, count in self.counts.items()
+                if count > 0}
+
+    def getViruses(self):
+        """
+        Returns a new list with a virus instance for every particle in the
+        population, so only use it with small populations.
+        """
+        viruses = []
+        for genotype, count in self.counts.items():
+            maxBirthProb, clearProb, mutProb, resistances = genotype
+            for particle in range(count):
+                viruses.append(ResistantVirus(maxBirthProb, clearProb,
+                                              dict(resistances), mutProb))
+        return viruses
+
+    def getTotalPop(self):
+        """
+        Gets the size of the current total virus population.
+        returns: The total virus population (an integer)
+        """
+        return sum(self.counts.values())
+
+    def getResistPop(self, drugResist):
+        """
+        Get the population of virus particles resistant to the drugs listed in
+        drugResist.
+
+        drugResist: Which drug resistances to include in the population (a
+        list of strings.
+
+        returns: The population of viruses (an integer) with resistances to
+        all drugs in the drugResist list.
+        """
+        total = 0
+        for genotype, count in self.counts.items():
+            resistances = dict(genotype[3])
+            if all(resistances.get(drug, False) for drug in drugResist):
+                total += count
+        return total
+
+    def getOffspring(self, genotype):
+        """
+        Returns the genotypes the offspring of GENOTYPE can have, each of its
+        resistances flipped or not, and their probabilities.
+        """
+        if genotype not in self.offspring:
+            maxBirthProb, clearProb, mutProb, resistances = genotype
+            children = [()]
+            probabilities = [1.0]
+            for drug, resistant in resistances:
+                children = ([child + ((drug, resistant),)
+                             for child in children] +
+                            [child + ((drug, not resistant),)
+                             for child in children])
+                # Line bellow broken to comply with pep8
+                probabilities = ([p * (1 - mutProb) for p in probabilities] +
+                                 [p * mutProb for p in probabilities])
+            # Line bellow broken to comply with pep8
+            self.offspring[genotype] = (
+                [(maxBirthProb, clearProb, mutProb, child)
+                 for child in children], probabilities)
+        return self.offspring[genotype]
+
+    def update(self):
+        """
+        Update the state of the virus population in this patient for a single
+        time step.
+
+        returns: The total virus population at the end of the update (an
+        integer)
+        """
+        generator = randomSupply.generator
+        genotypes = [genotype for genotype, count in self.counts.items()
+                     if count > 0]
+        counts = numpy.array([self.counts[genotype] for genotype in genotypes],
+                             dtype=numpy.int64)
+        clearProbs = numpy.array([genotype[1] for genotype in genotypes])
+        counts = generator.binomial(counts, 1 - clearProbs)
+        self.counts = dict(zip(genotypes, counts.tolist()))
+        popDensity = counts.sum() / self.getMaxPop()
+        if popDensity < 1:
+            drugs = self.getPrescriptions()
+            # Only particles resistant to every drug prescribed reproduce
+            birthProbs = numpy.array([
+                genotype[0] * (1 - popDensity)
+                if all(dict(genotype[3]).get(drug, False) for drug in drugs)
+                else 0.0 for genotype in genotypes])
+            births = generator.binomial(counts, birthProbs).tolist()
+            for genotype, born in zip(genotypes, births):
+                if born == 0:
+                    continue
+                children, probabilities = self.getOffspring(genotype)
+                if len(children) == 1:
+                    bornAs = [born]
+                else:
+                    bornAs = generator.multinomial(born, probabilities)
+                for child, count in zip(children, bornAs):
+                    self.counts[child] = self.counts.get(child, 0) + int(count)
+        return self.getTotalPop()
+
+
+class ParticlePatient(TreatedPatient):
+    """
+    Representation of a patient whose virus particles are kept as a struct
+    of arrays instead of a list of objects: NumPy arrays of each particle's
+    maxBirthProb, clearProb and mutProb, and boolean matrices, with a column
+    per drug in self.drugs, of which drugs each particle has a resistance
+    trait for and which of those it is resistant to.
+
+    Particles behave exactly as in TreatedPatient.update: each is cleared
+    with its clearProb, then, if the population density is below 1, each
+    survivor resistant to every drug prescribed reproduces with its
+    maxBirthProb * (1 - popDensity), counting in popDensity the children born
+    before it this time step, and each trait of a child is flipped with the
+    parent's mutProb. Only the random numbers are drawn in bulk.
+    """
+
+    def __init__(self, viruses, maxPop):
+        """
+        Initialization function, stores the viruses as arrays and saves the
+        maxPop parameter as an attribute. Also initializes the list of
+        drugs being administered (which should initially include no drugs).
+
+        viruses: The list representing the virus population (a list of
+        SimpleVirus or ResistantVirus instances)
+
+        maxPop: The maximum virus population for this patient (an integer)
+        """
+        TreatedPatient.__init__(self, [], maxPop)
+        self.drugs = []
+        for virus in viruses:
+            if isinstance(virus, ResistantVirus):
+                for drug in virus.getResistances():
+                    if drug not in self.drugs:
+                        self.drugs.append(drug)
+        self.birthProbs = numpy.array(
+            [virus.getMaxBirthProb() for virus in viruses], dtype=float)
+        self.clearProbs = numpy.array(
+            [virus.getClearProb() for virus in viruses], dtype=float)
+        self.mutProbs = numpy.zeros(len(viruses))
+        self.traits = numpy.zeros((len(viruses), len(self.drugs)), dtype=bool)
+        self.resistant = numpy.zeros_like(self.traits)
+        for i, virus in enumerate(viruses):
+            if isinstance(virus, ResistantVirus):
+                self.mutProbs[i] = virus.getMutProb()
+                for drug, resistant in virus.getResistances().items():
+                    self.traits[i, self.drugs.index(drug)] = True
+                    self.resistant[i, self.drugs.index(drug)] = resistant
+
+    def getViruses(self):
+        """
+        Returns a new list with a virus instance for every particle in the
+        population, so only use it with small populations.
+        """
+        viruses = []
+        for i in range(self.getTotalPop()):
+            resistances = {drug: bool(self.resistant[i, j])
+                           for j, drug in enumerate(self.drugs)
+                           if self.traits[i, j]}
+            # Line bellow broken to comply with pep8
+            viruses.append(ResistantVirus(
+                float(self.birthProbs[i]), float(self.clearProbs[i]),
+                resistances, float(self.mutProbs[i])))
+        return viruses
+
+    def getTotalPop(self):
+        """
+        Gets the size of the current total virus population.
+        returns: The total virus population (an integer)
+        """
+        return len(self.birthProbs)
+
+    def resistantToAll(self, drugs):
+        """
+        Returns a boolean array of which particles are resistant to every
+        drug in DRUGS (a list of strings).
+        """
+        resistant = numpy.ones(self.getTotalPop(), dtype=bool)
+        for drug in drugs:
+            if drug not in self.drugs:
+                return numpy.zeros(self.getTotalPop(), dtype=bool)
+            resistant &= self.resistant[:, self.drugs.index(drug)]
+        return resistant
+
+    def getResistPop(self, drugResist):
+        """
+        Get the population of virus particles resistant to the drugs listed in
+        drugResist.
+
+        drugResist: Which drug resistances to include in the population (a
+        list of strings.
+
+        returns: The population of viruses (an integer) with resistances to
+        all drugs in the drugResist list.
+        """
+        return int(self.resistantToAll(drugResist).sum())
+
+    def keep(self, particles):
+        """
+        Keeps only PARTICLES (a boolean mask or an array of indices) of the
+        population, in order.
+        """
+        self.birthProbs = self.birthProbs[particles]
+        self.clearProbs = self.clearProbs[particles]
+        self.mutProbs = self.mutProbs[particles]
+        self.traits = self.traits[particles]
+        self.resistant = self.resistant[particles]
+
+    def reproduceParticles(self, popDensity, activeDrugs):
+        """
+        Stochastically determines which virus particles reproduce at a time
+        step, as ResistantVirus.reproduce does for each particle in turn,
+        with popDensity growing by 1 / maxPop for every child born.
+
+        popDensity: the population density (a float) before any child is
+        born.
+
+        activeDrugs: a list of the drug names acting on the virus particles
+        (a list of strings).
+
+        returns: the offspring, as a tuple of arrays of maxBirthProb,
+        clearProb and mutProb, and of trait and resistance matrices, in the
+        order of the parents
+        """
+        generator = randomSupply.generator
+        draws = generator.random(self.getTotalPop())
+        # Children only make later particles less likely to reproduce, so
+        # only those that would with no children born yet need to be looked
+        # at one at a time
+        candidates = numpy.flatnonzero(
+            self.resistantToAll(activeDrugs) &
+            (draws <= self.birthProbs * (1 - popDensity)))
+        parents = []
+        population = popDensity * self.getMaxPop()
+        for i, draw, birthProb in zip(candidates.tolist(),
+                                      draws[candidates].tolist(),
+                                      self.birthProbs[candidates].tolist()):
+            # Line bellow broken to comply with pep8
+            if draw <= birthProb * (1 - (population + len(parents)) /
+                                    self.getMaxPop()):
+                parents.append(i)
+        parents = numpy.array(parents, dtype=numpy.int64)
+        traits = self.traits[parents]
+        mutations = (generator.random(traits.shape) <=
+                     self.mutProbs[parents, None]) & traits
+        return (self.birthProbs[parents], self.clearProbs[parents],
+                self.mutProbs[parents], traits,
+                self.resistant[parents] ^ mutations)
+
+    def update(self):
+        """
+        Update the state of the virus population in this patient for a single
+        time step.
+
+        returns: The total virus population at the end of the update (an
+        integer)
+        """
+        draws = randomSupply.generator.random(self.getTotalPop())
+        self.keep(draws > self.clearProbs)
         if self.getPopDensity() < 1:
-            copyViruses = self.getViruses()[:]
-            for virus in copyViruses:
-                try:
-                    # Line bellow broken to comply with pep8
-                    self.viruses.append(
-                        virus.reproduce(
-                            self.getPopDensity(), self.getPrescriptions()
-                        )
-                    )
-                except NoChildException:
-                    pass
+            offspring = self.reproduceParticles(self.getPopDensity(),
+                                                self.getPrescriptions())
+            self.birthProbs = numpy.concatenate((self.birthProbs,
+                                                 offspring[0]))
+            self.clearProbs = numpy.concatenate((self.clearProbs,
+                                                 offspring[1]))
+            self.mutProbs = numpy.concatenate((self.mutProbs, offspring[2]))
+            self.traits = numpy.concatenate((self.traits, offspring[3]))
+            self.resistant = numpy.concatenate((self.resistant,
+                                                offspring[4]))
         return self.getTotalPop()
 
 
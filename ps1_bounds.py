@@ -0,0 +1,42 @@
+# Lower bounds on the number of trips needed to carry items of the given
+# weights (any iterable of numbers) on a ship that carries at most limit.
+# Any allocation that uses as many trips as one of these bounds is optimal.
+import bisect
+
+
+# Every trip carries at most limit, so it takes at least this many trips to
+# carry the total weight.
+def sum_bound(weights, limit):
+    return -(-sum(weights) // limit)
+
+
+# No two items heavier than half the limit can share a trip.
+def half_limit_bound(weights, limit):
+    return sum(1 for weight in weights if 2 * weight > limit)
+
+
+# Martello and Toth's L2 bound, which is never below the two bounds above.
+# For each alpha, items heavier than limit - alpha travel alone, items
+# heavier than half the limit need a trip each, and items from alpha to half
+# the limit need whatever trips the room left on those is not enough for.
+def martello_toth_bound(weights, limit):
+    weights = sorted(weights)
+    total = [0]
+    for weight in weights:
+        total.append(total[-1] + weight)
+    half = bisect.bisect_right(weights, limit / 2)
+    bound = 0
+    for alpha in [0] + weights[:half]:
+        alone = bisect.bisect_right(weights, limit - alpha)
+        big = len(weights) - half
+        spare = (alone - half) * limit - (total[alone] - total[half])
+        small = total[half] - total[bisect.bisect_left(weights, alpha)]
+        bound = max(bound, big + max(0, -(-(small - spare) // limit)))
+    return bound
+
+
+# The best of the bounds above.
+def lower_bound(weights, limit):
+    weights = list(weights)
+    return max(sum_bound(weights, limit), half_limit_bound(weights, limit),
+               martello_toth_bound(weights, limit))
@@ -1,3 +1,7 @@
+from ps1_bounds import lower_bound
+import array
+
+
 #From codereview.stackexchange.com                    
 def partitions(set_):
     if not set_:
@@ -18,6 +22,153 @@ def get_partitions(set_):
     for partition in partitions(set_):
         yield [list(elt) for elt in partition]
 
+
+# Total weight of the items in a block (a bitmask over the items).
+def block_weight(block, weights):
+    return sum(weights[i] for i in range(len(weights)) if block >> i & 1)
+
+
+# Stands in for the table from subset_weights when there are too many items
+# to build it, summing each block's weight when it is looked up instead.
+class BlockWeights(object):
+    def __init__(self, weights):
+        self.weights = weights
+
+    def __getitem__(self, block):
+        return block_weight(block, self.weights)
+
+
+# Largest number of items to build a subset weight table for (2**24 64-bit
+# weights take 128MB).
+TABLE_MAX_ITEMS = 24
+
+
+# Returns a table of the total weight of every block of items, indexed by the
+# block's bitmask, so checking whether a block fits is a single lookup. Each
+# block's weight is a smaller block's weight plus one item: the table for the
+# first i items is extended with a copy of itself that has item i added, so
+# it takes O(2**n) time. Falls back to BlockWeights for too many items.
+def subset_weights(weights):
+    if len(weights) > TABLE_MAX_ITEMS:
+        return BlockWeights(weights)
+    table = array.array('q', [0])
+    for weight in weights:
+        table.extend([total + weight for total in table])
+    return table
+
+
+# Blocks are bitmasks over the items and table is their subset_weights. Yields
+# every way of splitting the items in rest into exactly count blocks that
+# each weigh at most limit, where each block holds the lowest item still left
+# (so no partition is repeated). Every (rest, count) found to have no such
+# split is added to the set deadEnds and not searched again.
+def feasible_blocks(rest, count, table, limit, deadEnds=None):
+    if rest == 0:
+        if count == 0:
+            yield []
+        return
+    if count == 0 or (deadEnds is not None and (rest, count) in deadEnds):
+        return
+    low = rest & -rest
+    others = rest ^ low
+    sub = others
+    found = False
+    while True:
+        block = sub | low
+        left = rest ^ block
+        # Cut off blocks that leave more weight than the other blocks can hold
+        if table[block] <= limit and table[left] <= (count - 1) * limit:
+            for tail in feasible_blocks(left, count - 1, table, limit,
+                                        deadEnds):
+                found = True
+                yield [block] + tail
+        if sub == 0:
+            break
+        sub = (sub - 1) & others
+    if not found and deadEnds is not None:
+        deadEnds.add((rest, count))
+
+
+# Like get_partitions, but takes a dictionary of item weights and a weight
+# limit, only yields partitions whose blocks all fit under the limit, and
+# yields them from fewest blocks to most, so the first one is optimal. No
+# partition has fewer blocks than the lower bound, so counting starts there.
+# If most is given, partitions with more blocks than that are not searched.
+# A subset_weights table of the weights from heaviest to lightest can be
+# passed in to share it between calls with the same weights.
+def get_feasible_partitions(weights, limit, most=None, table=None):
+    items = sorted(weights, key=weights.get, reverse=True)
+    itemWeights = [weights[item] for item in items]
+    if items == [] or itemWeights[0] > limit:
+        return
+    if most is None:
+        most = len(items)
+    if table is None:
+        table = subset_weights(itemWeights)
+    deadEnds = set()
+    for count in range(lower_bound(itemWeights, limit), most + 1):
+        for partition in feasible_blocks((1 << len(items)) - 1, count,
+                                         table, limit, deadEnds):
+            yield [[items[i] for i in range(len(items)) if block >> i & 1]
+                   for block in partition]
+
+
+# A sharded search splits the first-block bitmasks of partitions() between
+# worker processes and looks for partitions with one number of blocks at a
+# time, from fewest to most, like get_feasible_partitions: every shard is
+# searched for one count (a pool.map over the shards, which waits for all of
+# them) before any is searched for the next, so no worker spends time on
+# partitions bigger than the best one another worker is about to find. Each
+# worker gets the number of items, their subset weights (heaviest first) in
+# shared memory (a multiprocessing.RawArray, or the weights themselves when
+# there are too many items for a table), the limit, and a shared
+# multiprocessing.Value holding the fewest blocks found by any worker so far,
+# at which every worker stops. Dead ends are kept for the whole search in
+# each worker, so a count's search reuses what the smaller counts found.
+shardItems = None
+shardTable = None
+shardLimit = None
+shardBest = None
+shardDeadEnds = None
+
+
+def init_shard_search(items, table, limit, best):
+    global shardItems, shardTable, shardLimit, shardBest, shardDeadEnds
+    shardItems = items
+    if isinstance(table, list):
+        shardTable = BlockWeights(table)
+    else:
+        # Reading through a memoryview is faster than through ctypes
+        shardTable = memoryview(table).cast('B').cast('q')
+    shardLimit = limit
+    shardBest = best
+    shardDeadEnds = set()
+
+
+# Searches the first blocks (i << 1) | 1 for i in range(shard, 2**(n-1),
+# shards), so the first item is always in the first block, for a partition
+# into exactly count blocks. Returns the first one found (a list of blocks),
+# or None if there is none or another worker found one with count blocks or
+# fewer first.
+def search_shard(shard, shards, count):
+    full = (1 << shardItems) - 1
+    for i in range(shard, 1 << (shardItems - 1), shards):
+        if shardBest.value <= count:
+            break
+        block = (i << 1) | 1
+        # The same cut as in feasible_blocks
+        if shardTable[block] > shardLimit or \
+                shardTable[full ^ block] > (count - 1) * shardLimit:
+            continue
+        tail = next(feasible_blocks(full ^ block, count - 1, shardTable,
+                                    shardLimit, shardDeadEnds), None)
+        if tail is not None:
+            with shardBest.get_lock():
+                if count < shardBest.value:
+                    shardBest.value = count
+            return [block] + tail
+    return None
+
 ### Uncomment the following code  and run this file
 ### to see what get_partitions does if you want to visualize it:
 
@@ -3,10 +3,17 @@
 # See the problem set for instructions on how to use this code.
 
 import math
+import os
 import time
 
 from tkinter import *
 
+# Pixel colors for HeadlessRobotVisualization
+WHITE = b'\xff\xff\xff'
+GRAY = b'\xbe\xbe\xbe'
+BLACK = b'\x00\x00\x00'
+RED = b'\xff\x00\x00'
+
 class RobotVisualization:
     def __init__(self, num_robots, width, height, delay = 0.2):
         "Initializes a visualization with the specified parameters."
@@ -114,3 +121,160 @@ class RobotVisualization:
         "Indicate that the animation is done so that we allow the user to close the window."
         mainloop()
 
+
+
+class HeadlessRobotVisualization:
+    """
+    Draws the same animation as RobotVisualization without a display,
+    writing frames to PATH as fast as the simulation runs: to a sequence of
+    PPM images frame00000.ppm, frame00001.ppm, ... in the directory PATH, or,
+    if PATH ends in .gif, to an animated GIF (which needs Pillow).
+
+    Frames are drawn into a pixel buffer kept from one frame to the next, so
+    only the tiles cleaned since the last frame are painted (read from the
+    room's cleanLog when it has one, without emptying it, so a
+    TrajectoryRecorder can follow the same room) and only the pixels under
+    the robots are restored and redrawn. Only every EVERY-th call to update
+    writes a frame; the calls in between do no work. No status text is drawn.
+    """
+    def __init__(self, num_robots, width, height, path, tile_size = None,
+                 every = 1, delay = 0.2):
+        "Initializes a visualization with the specified parameters."
+        self.width = width
+        self.height = height
+        self.num_robots = num_robots
+        self.path = path
+        self.every = every
+        # Milliseconds to show each frame for in a GIF
+        self.duration = max(1, round(1000 * delay * every))
+        # Pixels per tile side, so the room fits in about 500x500 pixels
+        if tile_size is None:
+            tile_size = max(1, 500 // max(width, height))
+        self.tile_size = tile_size
+        self.pixel_width = width * tile_size
+        self.pixel_height = height * tile_size
+
+        # Tiles start gray, with black gridlines if the tiles are big enough
+        # to show them
+        self.pixels = bytearray(self.pixel_width * self.pixel_height * 3)
+        self.cleaned = bytearray(width * height)
+        self.num_cleaned = 0
+        # The room whose cleanLog is followed and how much of it is painted
+        self.logged_room = None
+        self.logged = 0
+        for i in range(width):
+            for j in range(height):
+                self._paint_tile(i, j, GRAY)
+
+        # Pixels covered by the robots: (offset, color underneath) pairs
+        self.under_robots = []
+        self.time = 0
+        self.frame = 0
+        self.gif_frames = None
+        if path.lower().endswith('.gif'):
+            # Fail now rather than at the first frame if Pillow is missing
+            from PIL import Image
+            self.gif_frames = []
+        else:
+            os.makedirs(path, exist_ok=True)
+
+    def _paint_tile(self, i, j, color):
+        "Fills the tile (i, j) with color, leaving its gridlines."
+        size = self.tile_size
+        inner = size - 1 if size >= 4 else size
+        row = color * inner
+        x = i * size
+        for y in range((self.height - 1 - j) * size,
+                       (self.height - j) * size):
+            offset = (y * self.pixel_width + x) * 3
+            if y % size == size - 1 and inner < size:
+                self.pixels[offset:offset + 3 * size] = BLACK * size
+            else:
+                self.pixels[offset:offset + 3 * inner] = row
+                if inner < size:
+                    self.pixels[offset + 3 * inner:offset + 3 * size] = BLACK
+
+    def _plot(self, x, y, color):
+        "Colors the pixel (x, y), remembering what was under it."
+        if 0 <= x < self.pixel_width and 0 <= y < self.pixel_height:
+            offset = (y * self.pixel_width + x) * 3
+            self.under_robots.append((offset,
+                                      self.pixels[offset:offset + 3]))
+            self.pixels[offset:offset + 3] = color
+
+    def _draw_robot(self, position, direction):
+        "Draws a robot as a red square with a black line to its heading."
+        size = self.tile_size
+        x = int(position.getX() * size)
+        y = int((self.height - position.getY()) * size)
+        radius = max(1, size // 6)
+        for dx in range(-radius, radius + 1):
+            for dy in range(-radius, radius + 1):
+                self._plot(x + dx, y + dy, RED)
+        for step in range(radius + 1, 3 * radius + 1):
+            self._plot(x + round(step * math.sin(math.radians(direction))),
+                       y - round(step * math.cos(math.radians(direction))),
+                       BLACK)
+
+    def _clean_tiles(self, room):
+        "Paints white the tiles cleaned since the last frame."
+        log = getattr(room, 'cleanLog', None)
+        if log is not None and room is self.logged_room:
+            tiles = log[self.logged:]
+            self.logged = len(log)
+        elif log is None and room.getNumCleanedTiles() == self.num_cleaned:
+            return
+        else:
+            # The room does not list the tiles it cleans (or has not been
+            # followed so far), so look at every one
+            if hasattr(room, 'enableCleanLog'):
+                room.enableCleanLog()
+                self.logged_room = room
+                self.logged = len(room.cleanLog)
+            tiles = [j * self.width + i for j in range(self.height)
+                     for i in range(self.width) if room.isTileCleaned(i, j)]
+        for tile in tiles:
+            if not self.cleaned[tile]:
+                self.cleaned[tile] = 1
+                self.num_cleaned += 1
+                self._paint_tile(tile % self.width, tile // self.width, WHITE)
+
+    def update(self, room, robots):
+        "Writes a frame of the room and robot state, if one is due."
+        self.time += 1
+        if (self.time - 1) % self.every:
+            return
+        self._render(room, robots)
+
+    def _render(self, room, robots):
+        "Redraws what changed since the last frame and writes the frame."
+        for offset, color in reversed(self.under_robots):
+            self.pixels[offset:offset + 3] = color
+        self.under_robots = []
+        self._clean_tiles(room)
+        for robot in robots:
+            self._draw_robot(robot.getRobotPosition(),
+                             robot.getRobotDirection())
+        if self.gif_frames is not None:
+            from PIL import Image
+            self.gif_frames.append(Image.frombytes(
+                'RGB', (self.pixel_width, self.pixel_height),
+                bytes(self.pixels)))
+        else:
+            name = os.path.join(self.path, 'frame%05d.ppm' % self.frame)
+            with open(name, 'wb') as frame:
+                frame.write(b'P6 %d %d 255\n' % (self.pixel_width,
+                                                 self.pixel_height))
+                frame.write(self.pixels)
+        self.frame += 1
+
+    def done(self, room = None, robots = None):
+        """Writes the frame of ROOM and ROBOTS if given and the last update
+        skipped it, and finishes the GIF."""
+        if room is not None and (self.time - 1) % self.every:
+            self._render(room, robots)
+        if self.gif_frames:
+            self.gif_frames[0].save(self.path, save_all = True,
+                                    append_images = self.gif_frames[1:],
+                                    duration = self.duration, loop = 0)
+            self.gif_frames = []
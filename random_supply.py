@@ -0,0 +1,56 @@
+# Random numbers for the simulations of Problem Sets 2 and 3, drawn from a
+# seeded NumPy generator a block at a time instead of one call at a time.
+import hashlib
+import itertools
+
+import numpy as np
+
+
+# Hands out uniforms in [0, 1) and ints in a range drawn from a NumPy
+# generator a block at a time, each kind (and each range) from a buffer of
+# its own. Blocks start at first_block numbers and double up to block_size,
+# so a supply that is only drawn from a little does not pay for large
+# blocks. It has the random and randrange methods the simulations use from
+# random.Random, so it can stand in for one. The seed may be an int, a
+# string (e.g. '7:3'), or None for a fresh seed from the operating system.
+# Whole arrays of draws can be had from the generator itself, e.g.
+# supply.generator.binomial(n, p).
+#
+# Making the generator costs about as much as a random.Random, but each
+# block costs as much as a dozen single draws, so a supply only pays off for
+# streams that are drawn from many times (hundreds of draws or more).
+class RandomSupply(object):
+    def __init__(self, seed=None, block_size=1 << 14, first_block=64):
+        if seed is not None and not isinstance(seed, int):
+            # Hashing is much quicker than seeding a random.Random
+            seed = int.from_bytes(
+                hashlib.sha256(str(seed).encode('utf-8')).digest(), 'big')
+        # The same generator as np.random.default_rng(seed), made in half
+        # the time
+        self.generator = np.random.Generator(np.random.PCG64(seed))
+        self.block_size = block_size
+        self.first_block = min(first_block, block_size)
+        # Handing out the next number is a single call into C; the Python
+        # generators below only run once a block
+        self.random = itertools.chain.from_iterable(
+            self.blocks(self.generator.random)).__next__
+        self.ranges = {}
+
+    def blocks(self, draw, *args):
+        size = self.first_block
+        while True:
+            yield draw(*args, size).tolist()
+            size = min(2 * size, self.block_size)
+
+    # A random int from start up to (but not including) stop, or from 0 up
+    # to start if stop is None, like random.randrange.
+    def randrange(self, start, stop=None):
+        if stop is None:
+            start, stop = 0, start
+        draw = self.ranges.get((start, stop))
+        if draw is None:
+            assert start < stop
+            draw = itertools.chain.from_iterable(
+                self.blocks(self.generator.integers, start, stop)).__next__
+            self.ranges[(start, stop)] = draw
+        return draw()